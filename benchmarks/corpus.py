@@ -0,0 +1,112 @@
+import random
+from typing import Callable, Mapping
+
+import numpy as np
+
+
+CPS_WIDTH, CPS_HEIGHT = 320, 200
+CPS_SIZE = CPS_WIDTH * CPS_HEIGHT
+LARGE_SIZE = 100000
+
+
+def noisy_image(seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, CPS_SIZE, dtype=np.uint8).tobytes()
+
+
+def flat_image(seed: int = 0) -> bytes:
+    # horizontal colour bands made of short runs, like dithered backgrounds
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, 12, CPS_SIZE)
+    values = rng.integers(0, 16, len(lengths), dtype=np.uint8)
+    runs = np.repeat(values, lengths)[:CPS_SIZE].reshape(CPS_HEIGHT, CPS_WIDTH)
+    bands = (np.arange(CPS_HEIGHT, dtype=np.uint8) // 25 * 16)[:, None]
+    return (runs + bands).tobytes()
+
+
+def sparse_delta(seed: int = 0, density: float = 0.02) -> bytes:
+    # xor of two consecutive frames where only a few small areas changed
+    rng = np.random.default_rng(seed)
+    delta = np.zeros((CPS_HEIGHT, CPS_WIDTH), dtype=np.uint8)
+    for _ in range(int(CPS_SIZE * density) // 64):
+        y = rng.integers(0, CPS_HEIGHT - 8)
+        x = rng.integers(0, CPS_WIDTH - 8)
+        delta[y : y + 8, x : x + 8] = rng.integers(1, 256, (8, 8))
+    return delta.tobytes()
+
+
+def long_runs(seed: int = 0, size: int = CPS_SIZE) -> bytes:
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(64, 2000, size // 64)
+    values = rng.integers(0, 256, len(lengths), dtype=np.uint8)
+    return np.repeat(values, lengths)[:size].tobytes()
+
+
+def large_buffer(seed: int = 0, size: int = LARGE_SIZE) -> bytes:
+    # more than 64 KiB, so encode_lcw switches to relative offsets
+    tiles = [flat_image(seed + i) for i in range(size // CPS_SIZE + 1)]
+    return b''.join(tiles)[:size]
+
+
+CORPORA: Mapping[str, Callable[[], bytes]] = {
+    'noisy': noisy_image,
+    'flat': flat_image,
+    'sparse_delta': sparse_delta,
+    'long_runs': long_runs,
+    'large': large_buffer,
+}
+
+
+def make_lcw_stream(size: int, seed: int = 0) -> bytes:
+    # mix of the command kinds found in typical CPS backgrounds
+    rng = random.Random(seed)
+    out = bytearray()
+    current = 0
+    while current < size:
+        left = size - current
+        kind = rng.random()
+        if current < 16 or kind < 0.3:
+            ln = min(left, rng.randrange(1, 0x40))
+            out += bytes([0x80 | ln]) + bytes(rng.randrange(256) for _ in range(ln))
+            current += ln
+            continue
+        elif kind < 0.6:
+            ln = rng.randrange(3, 0xB)
+            offs = rng.randrange(1, min(current, 0xFFF) + 1)
+            out += bytes([((ln - 3) << 4) | (offs >> 8), offs & 0xFF])
+        elif kind < 0.8:
+            ln = rng.randrange(3, 0x200)
+            offs = rng.randrange(current)
+            out += bytes([0xFF, ln & 0xFF, ln >> 8, offs & 0xFF, offs >> 8])
+        else:
+            ln = rng.randrange(3, 0x400)
+            out += bytes([0xFE, ln & 0xFF, ln >> 8, rng.randrange(256)])
+        # the decoder clamps the last command to the remaining size
+        current += min(left, ln)
+    return bytes(out + b'\x80')
+
+
+def make_rle_stream(data: bytes) -> bytes:
+    # straightforward CPS RLE encoding used to feed the decoder
+    out = bytearray()
+    size = len(data)
+    pos = 0
+    while pos < size:
+        end = pos + 1
+        while end < size and end - pos < 0xFFFF and data[end] == data[pos]:
+            end += 1
+        run = end - pos
+        if run > 0x80:
+            out += bytes([0]) + run.to_bytes(2, 'big') + data[pos : pos + 1]
+            pos = end
+        elif run > 2:
+            out += bytes([0x100 - run]) + data[pos : pos + 1]
+            pos = end
+        else:
+            start = pos
+            while pos < size and pos - start < 0x7F:
+                if pos + 2 < size and data[pos] == data[pos + 1] == data[pos + 2]:
+                    break
+                pos += 1
+            out += bytes([pos - start]) + data[start:pos]
+    return bytes(out)
@@ -0,0 +1,77 @@
+import io
+import timeit
+from typing import Callable, IO
+
+from benchmarks.corpus import CPS_SIZE, make_lcw_stream
+from kyraim.codex.base import BufferLike, read_uint16_le
+from kyraim.codex.lcw import decode_lcw
+
+
+def decode_lcw_bytewise(stream: IO[bytes], buffer: BufferLike, size: int) -> bytes:
+    # byte-at-a-time decoder kept as the baseline for comparison
+    out = bytearray(buffer)
+    current = 0
+    while current < size:
+        count = size - current
+        code = stream.read(1)[0]
+        if code == 0x80:
+            break
+        if not (code & 0x80):
+            ln = min(count, (code >> 4) + 3)
+            offs = ((code & 0xF) << 8) + stream.read(1)[0]
+            dst_offs = current - offs
+            for i in range(ln):
+                out[current + i] = out[dst_offs + i]
+            current += ln
+        elif code & 0x40:
+            ln = min(count, (code & 0x3F) + 3)
+            if code == 0xFE:
+                ln = min(count, read_uint16_le(stream))
+                out[current : current + ln] = stream.read(1) * ln
+                current += ln
+            else:
+                if code == 0xFF:
+                    ln = min(count, read_uint16_le(stream))
+                dst_offs = read_uint16_le(stream)
+                for i in range(ln):
+                    out[current + i] = out[dst_offs + i]
+                current += ln
+        else:
+            ln = min(count, code & 0x3F)
+            out[current : current + ln] = stream.read(ln)
+            current += ln
+    return bytes(out)
+
+
+def measure(
+    decoder: Callable[[IO[bytes], BufferLike, int], bytes],
+    data: bytes,
+    size: int,
+    repeat: int,
+) -> float:
+    def run() -> None:
+        with io.BytesIO(data) as stream:
+            decoder(stream, b'\0' * size, size)
+
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return size / best / 1e6
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='benchmark lcw decoding')
+    parser.add_argument('--size', type=int, default=CPS_SIZE, help='output size')
+    parser.add_argument('--repeat', type=int, default=20, help='timing rounds')
+    args = parser.parse_args()
+
+    data = make_lcw_stream(args.size)
+    with io.BytesIO(data) as s1, io.BytesIO(data) as s2:
+        expected = decode_lcw_bytewise(s1, b'\0' * args.size, args.size)
+        assert decode_lcw(s2, b'\0' * args.size, args.size) == expected
+
+    baseline = measure(decode_lcw_bytewise, data, args.size, args.repeat)
+    current = measure(decode_lcw, data, args.size, args.repeat)
+    print(f'bytewise   {baseline:8.2f} MB/s')
+    print(f'decode_lcw {current:8.2f} MB/s')
+    print(f'speedup    {current / baseline:8.2f}x')
@@ -0,0 +1,197 @@
+import io
+import json
+import statistics
+import timeit
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple
+
+import numpy as np
+
+from benchmarks.corpus import CORPORA, make_rle_stream
+from kyraim.codex.lcw import decode_lcw, encode_lcw
+from kyraim.codex.rle import decode_rle, encode_rle
+from kyraim.codex.xor_delta import (
+    apply_xor_delta,
+    compress_xor_buffer,
+    decompress_xor_buffer,
+)
+
+
+Runner = Callable[[], object]
+
+
+def bench_decode_lcw(data: bytes) -> Runner:
+    encoded = encode_lcw(data, 'fast')
+    size = len(data)
+    return lambda: decode_lcw(io.BytesIO(encoded), bytes(size), size)
+
+
+def bench_encode_lcw(data: bytes) -> Runner:
+    return lambda: encode_lcw(data)
+
+
+def bench_decompress_xor(data: bytes) -> Runner:
+    encoded = compress_xor_buffer(data)
+    return lambda: decompress_xor_buffer(encoded)
+
+
+def bench_apply_xor(data: bytes) -> Runner:
+    encoded = compress_xor_buffer(data)
+    frame = np.zeros(len(data), dtype=np.uint8)
+    return lambda: apply_xor_delta(encoded, frame)
+
+
+def bench_compress_xor(data: bytes) -> Runner:
+    return lambda: compress_xor_buffer(data)
+
+
+def bench_decode_rle(data: bytes) -> Runner:
+    encoded = make_rle_stream(data)
+    size = len(data)
+    return lambda: decode_rle(io.BytesIO(encoded), size)
+
+
+def bench_encode_rle(data: bytes) -> Runner:
+    return lambda: encode_rle(data)
+
+
+CODECS: Mapping[str, Callable[[bytes], Runner]] = {
+    'decode_lcw': bench_decode_lcw,
+    'encode_lcw': bench_encode_lcw,
+    'decompress_xor_buffer': bench_decompress_xor,
+    'apply_xor_delta': bench_apply_xor,
+    'compress_xor_buffer': bench_compress_xor,
+    'decode_rle': bench_decode_rle,
+    'encode_rle': bench_encode_rle,
+}
+
+
+class Result(NamedTuple):
+    codec: str
+    corpus: str
+    size: int
+    times: List[float]
+
+    @property
+    def key(self) -> str:
+        return f'{self.codec}/{self.corpus}'
+
+    @property
+    def mbps(self) -> float:
+        return self.size / statistics.median(self.times) / 1e6
+
+    @property
+    def best_mbps(self) -> float:
+        return self.size / min(self.times) / 1e6
+
+    @property
+    def spread(self) -> float:
+        # median absolute deviation relative to the median time
+        median = statistics.median(self.times)
+        return statistics.median(abs(t - median) for t in self.times) / median
+
+
+def run_suite(
+    codecs: Iterable[str],
+    corpora: Iterable[str],
+    repeat: int,
+) -> Iterator[Result]:
+    inputs = {name: CORPORA[name]() for name in corpora}
+    for codec in codecs:
+        for corpus, data in inputs.items():
+            runner = CODECS[codec](data)
+            runner()  # warm up
+            times = timeit.repeat(runner, number=1, repeat=repeat)
+            yield Result(codec, corpus, len(data), times)
+
+
+def find_regressions(
+    results: Iterable[Result],
+    minimums: Mapping[str, float],
+    baseline: Mapping[str, float],
+    tolerance: float,
+) -> Iterator[str]:
+    for result in results:
+        limit = minimums.get(result.key, minimums.get(result.codec))
+        if limit is not None and result.mbps < limit:
+            yield f'{result.key}: {result.mbps:.2f} MB/s is below {limit:.2f} MB/s'
+        if result.key in baseline:
+            expected = baseline[result.key] * (1 - tolerance)
+            if result.mbps < expected:
+                yield (
+                    f'{result.key}: {result.mbps:.2f} MB/s is more than '
+                    f'{tolerance:.0%} below baseline {baseline[result.key]:.2f} MB/s'
+                )
+
+
+def parse_minimums(specs: Iterable[str]) -> Dict[str, float]:
+    minimums = {}
+    for spec in specs:
+        key, _, value = spec.partition('=')
+        minimums[key] = float(value)
+    return minimums
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='benchmark codec throughput')
+    parser.add_argument(
+        '--codec',
+        '-c',
+        action='append',
+        choices=CODECS,
+        help='codecs to measure (default: all)',
+    )
+    parser.add_argument(
+        '--corpus',
+        '-i',
+        action='append',
+        choices=CORPORA,
+        help='synthetic inputs to use (default: all)',
+    )
+    parser.add_argument('--repeat', '-r', type=int, default=7, help='timing rounds')
+    parser.add_argument(
+        '--min',
+        '-m',
+        action='append',
+        default=[],
+        metavar='CODEC[/CORPUS]=MBPS',
+        help='fail when median throughput falls below the given MB/s',
+    )
+    parser.add_argument('--baseline', '-b', help='json results to compare against')
+    parser.add_argument(
+        '--tolerance',
+        '-t',
+        type=float,
+        default=0.2,
+        help='allowed relative slowdown from baseline',
+    )
+    parser.add_argument('--save', '-s', help='write results as json')
+    args = parser.parse_args()
+
+    results = []
+    print(f'{"codec/corpus":40} {"size":>8} {"MB/s":>9} {"best":>9} {"spread":>7}')
+    for result in run_suite(args.codec or CODECS, args.corpus or CORPORA, args.repeat):
+        results.append(result)
+        print(
+            f'{result.key:40} {result.size:8d} {result.mbps:9.2f} '
+            f'{result.best_mbps:9.2f} {result.spread:7.1%}'
+        )
+
+    if args.save:
+        with open(args.save, 'w') as out:
+            json.dump({result.key: result.mbps for result in results}, out, indent=2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    regressions = list(
+        find_regressions(results, parse_minimums(args.min), baseline, args.tolerance)
+    )
+    for regression in regressions:
+        print('REGRESSION', regression, file=sys.stderr)
+    if regressions:
+        exit(1)
@@ -1,6 +1,10 @@
 import io
+import mmap
 import os
 import pathlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import AbstractContextManager, contextmanager
 from types import TracebackType
 from typing import (
@@ -18,6 +22,7 @@ from typing import (
     Type,
     TypeVar,
     Union,
+    cast,
 )
 
 
@@ -36,6 +41,7 @@ class _SimpleEntry(NamedTuple):
 
 
 SimpleEntry = Union[_SimpleEntry, Tuple[int, int]]
+EntryData = Union[bytes, memoryview]
 
 
 def read_file(stream: IO[bytes], offset: int, size: int) -> bytes:
@@ -45,18 +51,209 @@ def read_file(stream: IO[bytes], offset: int, size: int) -> bytes:
     return stream.read(size)
 
 
+def pread_file(fd: int, offset: int, size: int) -> bytes:
+    # positional read, does not touch the shared file position
+    parts = []
+    while size > 0:
+        chunk = os.pread(fd, size, offset)
+        if not chunk:
+            break
+        parts.append(chunk)
+        offset += len(chunk)
+        size -= len(chunk)
+    return b''.join(parts)
+
+
+def positional_fileno(stream: IO[bytes]) -> Optional[int]:
+    if not hasattr(os, 'pread'):
+        return None
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError):
+        return None
+
+
+DEFAULT_INFLIGHT_BYTES = 64 * 1024 * 1024
+
+
+class ExtractProgress(NamedTuple):
+    files: int
+    total_files: int
+    nbytes: int
+    elapsed: float
+
+    @property
+    def throughput(self) -> float:
+        # bytes per second
+        return self.nbytes / self.elapsed if self.elapsed else 0.0
+
+
+class ByteBudget:
+    # caps the bytes held by concurrent readers, a single oversized entry is
+    # still let through alone so it cannot block forever
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.used = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, size: int) -> Iterator[None]:
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.used == 0 or self.used + size <= self.limit
+            )
+            self.used += size
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.used -= size
+                self._cond.notify_all()
+
+
+# read-only seekable stream over a buffer, without copying it
+class MemoryViewStream(io.BufferedIOBase):
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview, mmap.mmap]) -> None:
+        super().__init__()
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def getbuffer(self) -> memoryview:
+        # a view of its own, releasing it leaves the stream usable
+        return self._view[:]
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        start = min(self._pos, len(self._view))
+        end = len(self._view) if size is None or size < 0 else start + size
+        data = bytes(self._view[start:end])
+        self._pos = start + len(data)
+        return data
+
+    read1 = read
+
+    def readinto(self, buffer: Any) -> int:
+        target = memoryview(buffer).cast('B')
+        data = self.read(len(target))
+        target[: len(data)] = data
+        return len(data)
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += len(self._view)
+        if pos < 0:
+            raise ValueError(f'negative seek position {pos}')
+        self._pos = pos
+        return pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        super().close()
+        try:
+            self._view.release()
+        except BufferError:
+            pass
+
+
+# read-only seekable window over a region of a parent file, read on demand
+class WindowStream(io.RawIOBase):
+    def __init__(
+        self, read_at: Callable[[int, int], bytes], offset: int, size: int
+    ) -> None:
+        super().__init__()
+        self._read_parent = read_at
+        self._offset = offset
+        self._size = size
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def pread(self, offset: int, size: int) -> bytes:
+        # positional read relative to the window, clipped to its end
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        offset = min(offset, self._size)
+        size = min(size, self._size - offset)
+        if size <= 0:
+            return b''
+        return self._read_parent(self._offset + offset, size)
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._size
+        data = self.pread(self._pos, size)
+        self._pos += len(data)
+        return data
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, buffer: Any) -> int:
+        target = memoryview(buffer).cast('B')
+        data = self.read(len(target))
+        target[: len(data)] = data
+        return len(data)
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._size
+        if pos < 0:
+            raise ValueError(f'negative seek position {pos}')
+        self._pos = pos
+        return pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def map_stream(stream: IO[bytes]) -> Tuple[Optional[mmap.mmap], memoryview]:
+    # streams over memory are shared as they are, files are memory mapped
+    getbuffer = getattr(stream, 'getbuffer', None)
+    if getbuffer is not None:
+        return None, getbuffer()
+    mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    return mapped, memoryview(mapped)
+
+
 class BaseArchive(AbstractContextManager, Generic[EntryType]):
     _stream: IO[bytes]
+    _mapped: Optional[mmap.mmap] = None
+    _buffer: Optional[memoryview] = None
 
     index: Mapping[str, EntryType]
 
     def _create_index(self) -> ArchiveIndex[EntryType]:
         raise NotImplementedError('create_index')
 
-    def _read_entry(self, entry: EntryType) -> bytes:
+    def _read_entry(self, entry: EntryType) -> EntryData:
         raise NotImplementedError('read_entry')
 
-    def __init__(self, file: Union[AnyStr, os.PathLike[AnyStr], IO[bytes]]) -> None:
+    def _entry_window(self, entry: EntryType) -> Tuple[int, int]:
+        raise NotImplementedError('entry_window')
+
+    def __init__(
+        self,
+        file: Union[AnyStr, os.PathLike[AnyStr], IO[bytes]],
+        use_mmap: bool = False,
+        index: Optional[ArchiveIndex[EntryType]] = None,
+    ) -> None:
         if isinstance(file, os.PathLike):
             file = os.fspath(file)
 
@@ -64,23 +261,77 @@ class BaseArchive(AbstractContextManager, Generic[EntryType]):
             self._stream = io.open(file, 'rb')
         else:
             self._stream = file
-        self.index = self._create_index()
 
-    @contextmanager
-    def open(self, fname: str, mode: str = 'r') -> Iterator[IO]:
+        self._lock = threading.Lock()
+        self._fileno = positional_fileno(self._stream)
+
+        if use_mmap:
+            try:
+                self._mapped, self._buffer = map_stream(self._stream)
+            except (OSError, ValueError):
+                # not a regular file (or an empty one), keep reading the stream
+                pass
+
+        # a previously parsed index (e.g. from an index cache) skips the scan
+        self.index = self._create_index() if index is None else index
+
+    def read(self, fname: str) -> EntryData:
+        # the whole member, a view of the mapping when the archive is mapped
         if not fname in self.index:
             raise ValueError(f'no member {fname} found in archive')
+        return self._read_entry(self.index[fname])
 
-        data = self._read_entry(self.index[fname])
+    @contextmanager
+    def open(self, fname: str, mode: str = 'r') -> Iterator[IO]:
+        data = self.read(fname)
 
         stream: IO
-        with io.BytesIO(data) as stream:
+        if isinstance(data, memoryview):
+            stream = cast(IO[bytes], MemoryViewStream(data))
+        else:
+            stream = io.BytesIO(data)
+        with stream:
             if not 'b' in mode:
                 stream = io.TextIOWrapper(stream, encoding='utf-8')
             yield stream
 
+    @contextmanager
+    def substream(self, fname: str) -> Iterator[IO[bytes]]:
+        # seekable view of a member without reading it, for nested archives
+        if not fname in self.index:
+            raise ValueError(f'no member {fname} found in archive')
+
+        entry = self.index[fname]
+        stream: IO[bytes]
+        if self._buffer is not None:
+            stream = cast(IO[bytes], MemoryViewStream(self._read_entry(entry)))
+        else:
+            window = WindowStream(self._read_at, *self._entry_window(entry))
+            stream = cast(IO[bytes], window)
+        with stream:
+            yield stream
+
+    def _read_at(self, offset: int, size: int) -> bytes:
+        if self._fileno is not None:
+            return pread_file(self._fileno, offset, size)
+        if isinstance(self._stream, WindowStream):
+            return self._stream.pread(offset, size)
+        # streams without a file descriptor are shared, seek and read together
+        with self._lock:
+            return read_file(self._stream, offset, size)
+
     def close(self) -> Optional[bool]:
-        return self._stream.close()
+        try:
+            if self._buffer is not None:
+                self._buffer.release()
+            if self._mapped is not None:
+                self._mapped.close()
+            return self._stream.close()
+        except BufferError:
+            # entries are still referenced, the memory goes away along with them
+            if self._mapped is not None:
+                return self._stream.close()
+            return None
 
     def __exit__(
         self,
@@ -90,24 +341,72 @@ class BaseArchive(AbstractContextManager, Generic[EntryType]):
     ) -> Optional[bool]:
         return self.close()
 
-    def __iter__(self) -> Iterator[Tuple[str, bytes]]:
+    def __iter__(self) -> Iterator[Tuple[str, EntryData]]:
         for fname, entry in self.index.items():
             yield fname, self._read_entry(entry)
 
     def glob(self, pattern: str) -> Iterator[str]:
         return (fname for fname in self.index if pathlib.Path(fname).match(pattern))
 
-    def extractall(self, dirname: str) -> None:
+    def _entry_size(self, entry: EntryType) -> int:
+        raise NotImplementedError('entry_size')
+
+    def extractall(
+        self,
+        dirname: str,
+        pattern: Optional[str] = None,
+        workers: int = 1,
+        max_inflight_bytes: int = DEFAULT_INFLIGHT_BYTES,
+        progress: Optional[Callable[[ExtractProgress], None]] = None,
+    ) -> ExtractProgress:
         create_directory(dirname)
-        for fname, filedata in self:
-            with io.open(os.path.join(dirname, fname), 'wb') as out_file:
-                out_file.write(filedata)
+        fnames = list(self.index if pattern is None else self.glob(pattern))
+        budget = ByteBudget(max_inflight_bytes)
+        lock = threading.Lock()
+        start = time.perf_counter()
+        status = ExtractProgress(0, len(fnames), 0, 0.0)
+
+        def extract(fname: str) -> None:
+            nonlocal status
+            entry = self.index[fname]
+            size = self._entry_size(entry) if workers > 1 else 0
+            with budget.reserve(size):
+                filedata = self._read_entry(entry)
+                with io.open(os.path.join(dirname, fname), 'wb') as out_file:
+                    out_file.write(filedata)
+            with lock:
+                status = ExtractProgress(
+                    status.files + 1,
+                    status.total_files,
+                    status.nbytes + len(filedata),
+                    time.perf_counter() - start,
+                )
+                if progress is not None:
+                    progress(status)
+
+        if workers > 1:
+            with ThreadPoolExecutor(workers) as executor:
+                for _ in executor.map(extract, fnames):
+                    pass
+        else:
+            for fname in fnames:
+                extract(fname)
+        return status
 
 
 class SimpleArchive(BaseArchive[SimpleEntry]):
-    def _read_entry(self, entry: SimpleEntry) -> bytes:
+    def _entry_size(self, entry: SimpleEntry) -> int:
+        return _SimpleEntry(*entry).size
+
+    def _entry_window(self, entry: SimpleEntry) -> Tuple[int, int]:
+        entry = _SimpleEntry(*entry)
+        return entry.offset, entry.size
+
+    def _read_entry(self, entry: SimpleEntry) -> EntryData:
         entry = _SimpleEntry(*entry)
-        return read_file(self._stream, entry.offset, entry.size)
+        if self._buffer is not None:
+            return self._buffer[entry.offset : entry.offset + entry.size]
+        return self._read_at(entry.offset, entry.size)
 
 
 def make_opener(
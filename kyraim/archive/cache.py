@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import pathlib
+from contextlib import AbstractContextManager, contextmanager, suppress
+from types import TracebackType
+from typing import (
+    IO,
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Type,
+    Union,
+)
+
+from kyraim.archive.base import ArchiveIndex, ArchiveType, SimpleEntry
+
+
+PathType = Union[str, 'os.PathLike[str]']
+
+CACHE_FILENAME = '.kyraim-index.json'
+CACHE_VERSION = 1
+
+# key for the index of the archive file itself, as opposed to nested members
+SELF = ''
+
+
+def file_stamp(path: PathType) -> List[int]:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def encode_index(index: ArchiveIndex[SimpleEntry]) -> Dict[str, List[int]]:
+    return {fname: list(entry) for fname, entry in index.items()}
+
+
+def decode_index(index: Dict[str, List[int]]) -> ArchiveIndex[SimpleEntry]:
+    return {fname: (offset, size) for fname, (offset, size) in index.items()}
+
+
+class IndexCache(AbstractContextManager):
+    # Persists parsed archive indices and directory listings across runs.
+    # Records are keyed by absolute path and validated against size and mtime,
+    # a stale record is dropped and rebuilt the next time it is requested.
+
+    def __init__(self, cache_file: PathType) -> None:
+        self.cache_file = pathlib.Path(cache_file)
+        self._archives: Dict[str, Dict[str, Any]] = {}
+        self._scans: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._load()
+
+    @classmethod
+    def for_directory(cls, path: PathType) -> 'IndexCache':
+        return cls(pathlib.Path(path) / CACHE_FILENAME)
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            return
+        if content.get('version') != CACHE_VERSION:
+            return
+        self._archives = content.get('archives', {})
+        self._scans = content.get('scans', {})
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        content = {
+            'version': CACHE_VERSION,
+            'archives': self._archives,
+            'scans': self._scans,
+        }
+        tmp_file = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(content, f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as exc:
+            # e.g. a read-only game directory, the next run scans again
+            logging.warning(f'Cannot save index cache {self.cache_file}: {exc}')
+            with suppress(OSError):
+                os.remove(tmp_file)
+            return
+        self._dirty = False
+
+    def _record(self, path: PathType) -> Dict[str, Any]:
+        key = os.path.abspath(path)
+        stamp = file_stamp(path)
+        record = self._archives.get(key)
+        if record is None or record['stamp'] != stamp:
+            record = {'stamp': stamp, 'indices': {}}
+            self._archives[key] = record
+            self._dirty = True
+        return record
+
+    def glob(self, path: PathType, pattern: str) -> List[pathlib.Path]:
+        path = pathlib.Path(path)
+        key = os.path.abspath(path)
+        # adding or removing files updates the directory mtime
+        stamp = os.stat(path).st_mtime_ns
+        scan = self._scans.get(key)
+        if scan is None or scan['stamp'] != stamp:
+            scan = {'stamp': stamp, 'patterns': {}}
+            self._scans[key] = scan
+            self._dirty = True
+        names = scan['patterns'].get(pattern)
+        if names is None:
+            names = sorted(str(fname.relative_to(path)) for fname in path.glob(pattern))
+            scan['patterns'][pattern] = names
+            self._dirty = True
+        return [path / fname for fname in names]
+
+    @contextmanager
+    def open(
+        self,
+        opener: Callable[..., ContextManager[ArchiveType]],
+        path: PathType,
+        stream: Optional[IO[bytes]] = None,
+        member: str = SELF,
+        **kwargs: Any,
+    ) -> Iterator[ArchiveType]:
+        # nested archives are read from `stream` but validated against `path`
+        record = self._record(path)
+        index = record['indices'].get(member)
+        if index is not None:
+            kwargs['index'] = decode_index(index)
+        with opener(path if stream is None else stream, **kwargs) as archive:
+            if index is None:
+                record['indices'][member] = encode_index(archive.index)
+                self._dirty = True
+            yield archive
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.save()
@@ -0,0 +1,143 @@
+import hashlib
+import io
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Tuple
+
+from kyraim.archive.base import BaseArchive, EntryData, create_directory
+
+
+DIGEST_SIZE = 16
+
+
+def entry_digest(data: EntryData) -> bytes:
+    # blake2b releases the GIL on large buffers, so threads hash in parallel
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+class ContentEntry(NamedTuple):
+    archive: str
+    fname: str
+    size: int
+    digest: bytes
+
+
+class DedupStats(NamedTuple):
+    files: int
+    unique: int
+    nbytes: int
+    saved: int
+
+
+class ContentIndex:
+    # Digest of every entry across a set of open archives, labelled by name.
+    # Entries with equal digests share their payload on extraction.
+
+    def __init__(self) -> None:
+        self.entries: List[ContentEntry] = []
+        self._archives: Dict[str, BaseArchive] = {}
+
+    def add_archive(self, label: str, archive: BaseArchive, workers: int = 1) -> None:
+        if label in self._archives:
+            raise ValueError(f'archive {label} already indexed')
+        self._archives[label] = archive
+
+        def digest(fname: str) -> Tuple[int, bytes]:
+            data = archive.read(fname)
+            return len(data), entry_digest(data)
+
+        fnames = list(archive.index)
+        if workers > 1:
+            with ThreadPoolExecutor(workers) as executor:
+                digests = list(executor.map(digest, fnames))
+        else:
+            digests = [digest(fname) for fname in fnames]
+
+        self.entries.extend(
+            ContentEntry(label, fname, size, dgst)
+            for fname, (size, dgst) in zip(fnames, digests)
+        )
+
+    def groups(self) -> Dict[bytes, List[ContentEntry]]:
+        # in order of first appearance
+        groups: Dict[bytes, List[ContentEntry]] = {}
+        for entry in self.entries:
+            groups.setdefault(entry.digest, []).append(entry)
+        return groups
+
+    def duplicates(self) -> List[List[ContentEntry]]:
+        return [group for group in self.groups().values() if len(group) > 1]
+
+    def extractall(self, dirname: str) -> DedupStats:
+        # Every unique payload is written once under dirname/<archive>/<fname>,
+        # copies are hard links to it (plain copies where linking fails), so
+        # editing one extracted copy in place changes all of them.
+        files = unique = nbytes = saved = 0
+        for group in self.groups().values():
+            first, *rest = group
+            first_path = os.path.join(dirname, first.archive, first.fname)
+            create_directory(os.path.dirname(first_path))
+            archive = self._archives[first.archive]
+            with io.open(first_path, 'wb') as out_file:
+                out_file.write(archive.read(first.fname))
+            files += 1
+            unique += 1
+            nbytes += first.size
+
+            for entry in rest:
+                path = os.path.join(dirname, entry.archive, entry.fname)
+                create_directory(os.path.dirname(path))
+                if os.path.lexists(path):
+                    os.remove(path)
+                try:
+                    os.link(first_path, path)
+                except OSError:
+                    shutil.copyfile(first_path, path)
+                files += 1
+                saved += entry.size
+        return DedupStats(files, unique, nbytes, saved)
+
+
+if __name__ == '__main__':
+    import argparse
+    import glob
+    from contextlib import ExitStack
+    from itertools import chain
+    from pathlib import Path
+
+    from kyraim.archive import installer, pakfile
+
+    parser = argparse.ArgumentParser(
+        description='extract archives, storing duplicate entries once'
+    )
+    parser.add_argument('files', nargs='+', help='pak files or installer volumes')
+    parser.add_argument('--output', '-o', default='.', help='output directory')
+    parser.add_argument(
+        '--workers', '-j', type=int, default=1, help='number of parallel hashers'
+    )
+    args = parser.parse_args()
+
+    files = sorted(set(chain.from_iterable(glob.iglob(r) for r in args.files)))
+    content = ContentIndex()
+    with ExitStack() as stack:
+        for filename in files:
+            label = os.path.basename(filename)
+            if Path(filename).match('WESTWOOD.0*'):
+                ins = stack.enter_context(installer.open(filename, use_mmap=True))
+                content.add_archive(label, ins, workers=args.workers)
+                for archive in ins.glob('*.PAK'):
+                    stream = stack.enter_context(ins.substream(archive))
+                    pak = stack.enter_context(pakfile.open(stream, use_mmap=True))
+                    # beside the installer directory, which holds the PAK itself
+                    content.add_archive(f'{label}-{archive}', pak, workers=args.workers)
+            else:
+                pak = stack.enter_context(pakfile.open(filename, use_mmap=True))
+                content.add_archive(label, pak, workers=args.workers)
+
+        stats = content.extractall(args.output)
+
+    print(
+        f'{stats.files} files, {stats.unique} unique, '
+        f'{stats.nbytes} bytes written, {stats.saved} bytes linked'
+    )
@@ -36,6 +36,10 @@ if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='extract pak archive')
     parser.add_argument('files', nargs='+', help='files to extract')
+    parser.add_argument('--pattern', '-p', help='extract only matching entries')
+    parser.add_argument(
+        '--workers', '-j', type=int, default=1, help='number of parallel extractors'
+    )
     args = parser.parse_args()
 
     files = set(chain.from_iterable(glob.iglob(r) for r in args.files))
@@ -43,4 +47,8 @@ if __name__ == '__main__':
     for filename in files:
         dirname = os.path.basename(filename)
         with WestwoodInstaller(filename) as inst:
-            inst.extractall(dirname)
+            done = inst.extractall(dirname, pattern=args.pattern, workers=args.workers)
+            print(
+                f'{filename}: {done.files} files, {done.nbytes} bytes, '
+                f'{done.throughput / 1e6:.2f} MB/s'
+            )
@@ -1,34 +1,54 @@
 #!/usr/bin/env python3
 
+import io
 import os
 import glob
 
-from itertools import takewhile, chain
-from functools import partial
+from itertools import chain
 
-from typing import Any, IO, Iterable, Sequence, Tuple
+from typing import IO, Iterable, Sequence, Tuple
 
 from kyraim.archive.base import ArchiveIndex, SimpleArchive, SimpleEntry, make_opener
-from kyraim.codex.base import readcstr, read_uint32_le
+from kyraim.codex.base import read_uint32_le
 
 
 GLOB_ALL = '*'
 
 
-def read_index_entry(stream: IO[bytes]) -> Tuple[str, int]:
-    return readcstr(stream).decode(), read_uint32_le(stream)
-
-
-def before_offset(stream: IO[bytes], off: int, *args: Any) -> bool:
-    return stream.tell() < off
-
-
 def read_index_entries(stream: IO[bytes]) -> Tuple[Sequence[str], Sequence[int]]:
+    start = stream.tell()
+    stream.seek(0, io.SEEK_END)
+    file_size = stream.tell() - start
+    stream.seek(start, io.SEEK_SET)
+
     off = read_uint32_le(stream)
-    index_entries = iter(partial(read_index_entry, stream), ('', 0))
-    index_entries = takewhile(partial(before_offset, stream, off), index_entries)
-    names, offs = zip(*index_entries)
-    return names, (off,) + tuple(offs)
+    if off < 4 or off > file_size:
+        raise EOFError(f'PAK index of {off} bytes does not fit in {file_size} bytes')
+
+    # the whole index precedes the first entry, read it at once
+    index = stream.read(off - 4)
+    names = []
+    offs = [off]
+    pos = 0
+    while pos < len(index):
+        end = index.find(b'\0', pos)
+        if end < 0:
+            raise EOFError('PAK index ends inside an entry name')
+        if end == pos:
+            # empty name terminates the index
+            break
+        if end + 5 > len(index):
+            raise EOFError('PAK index ends inside an entry offset')
+        names.append(index[pos:end].decode())
+        offs.append(int.from_bytes(index[end + 1 : end + 5], byteorder='little'))
+        pos = end + 5
+
+    for name, (start_off, end_off) in zip(names, zip(offs, offs[1:])):
+        if end_off < start_off:
+            raise ValueError(f'PAK entry {name} ends before it starts')
+    if offs[-1] > file_size:
+        raise EOFError(f'PAK data ends at {offs[-1]} but file has {file_size} bytes')
+    return names, offs
 
 
 def create_index_mapping(
@@ -52,6 +72,10 @@ if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='extract pak archive')
     parser.add_argument('files', nargs='+', help='files to extract')
+    parser.add_argument('--pattern', '-p', help='extract only matching entries')
+    parser.add_argument(
+        '--workers', '-j', type=int, default=1, help='number of parallel extractors'
+    )
     args = parser.parse_args()
 
     files = set(chain.from_iterable(glob.iglob(r) for r in args.files))
@@ -59,7 +83,11 @@ if __name__ == '__main__':
     for filename in files:
         dirname = os.path.basename(filename)
         with PakFile(filename) as pak:
-            pak.extractall(dirname)
+            done = pak.extractall(dirname, pattern=args.pattern, workers=args.workers)
+            print(
+                f'{filename}: {done.files} files, {done.nbytes} bytes, '
+                f'{done.throughput / 1e6:.2f} MB/s'
+            )
             if dirname == 'INTRO.VRM':
                 with pak.open('INTROPAT.BAT', 'r') as bat:
                     print(''.join(bat))
@@ -1,6 +1,20 @@
+import hashlib
+import io
 import logging
+import os
+import tempfile
 from itertools import chain
-from typing import Iterator, Iterable, Sequence, Tuple, TypeVar
+from typing import (
+    IO,
+    Callable,
+    Iterator,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
 from kyraim.archive import pakfile
 from kyraim.codex.base import write_uint32_le
@@ -8,9 +22,10 @@ from kyraim.codex.base import write_uint32_le
 T = TypeVar('T')
 U = TypeVar('U')
 
-PairIterator = Iterator[Tuple[T, U]]
 PairIterable = Iterable[Tuple[T, U]]
 
+COPY_CHUNK_SIZE = 1024 * 1024
+
 logging.basicConfig(level=logging.DEBUG)
 
 
@@ -22,46 +37,256 @@ def write_index_entry(fname: str, offset: int) -> bytes:
     return write_uint32_le(offset) + fname.encode() + b'\00'
 
 
-def generate_index(data_files: PairIterator[str, bytes]) -> PairIterator[bytes, bytes]:
-    end = ('\00\00\00\00', b'')
-    pak_index, rdata = zip(*chain(data_files, (end,)))
+def generate_sized_index(data_files: PairIterable[str, int]) -> Iterator[bytes]:
+    end = ('\00\00\00\00', 0)
+    pak_index, lns = zip(*chain(data_files, (end,)))
     off = calculate_index_length(pak_index)
-    for fname, fdata in zip(pak_index, rdata):
-        yield write_index_entry(fname, off), fdata
-        off += len(fdata)
+    for fname, size in zip(pak_index, lns):
+        yield write_index_entry(fname, off)
+        off += size
+
+
+def stream_fileno(stream: IO[bytes]) -> Optional[int]:
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError):
+        return None
+
+
+def _copy_file_range(
+    src_fd: int, dst_fd: int, src_off: int, dst_off: int, size: int
+) -> int:
+    return os.copy_file_range(src_fd, dst_fd, size, src_off, dst_off)
+
+
+def _sendfile(src_fd: int, dst_fd: int, src_off: int, dst_off: int, size: int) -> int:
+    os.lseek(dst_fd, dst_off, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, src_off, size)
+
+
+KERNEL_COPIES = [
+    method
+    for name, method in (('copy_file_range', _copy_file_range), ('sendfile', _sendfile))
+    if hasattr(os, name)
+]
+
+
+def kernel_copy(src_fd: int, dst_fd: int, src_off: int, dst_off: int, size: int) -> int:
+    copied = 0
+    for method in KERNEL_COPIES:
+        try:
+            while copied < size:
+                ln = method(
+                    src_fd, dst_fd, src_off + copied, dst_off + copied, size - copied
+                )
+                if not ln:
+                    break
+                copied += ln
+            return copied
+        except OSError:
+            # unsupported for this pair of files (e.g. across filesystems)
+            continue
+    return copied
+
+
+def copy_range(source: IO[bytes], output: IO[bytes], offset: int, size: int) -> int:
+    copied = 0
+    src_fd, dst_fd = stream_fileno(source), stream_fileno(output)
+    if src_fd is not None and dst_fd is not None:
+        output.flush()
+        start = output.tell()
+        copied = kernel_copy(src_fd, dst_fd, offset, start, size)
+        output.seek(start + copied, io.SEEK_SET)
+
+    # whatever the kernel did not copy goes through a bounded buffer
+    source.seek(offset + copied, io.SEEK_SET)
+    while copied < size:
+        chunk = source.read(min(COPY_CHUNK_SIZE, size - copied))
+        if not chunk:
+            break
+        output.write(chunk)
+        copied += len(chunk)
+    return copied
+
+
+class PakWriter:
+    # Writes a PAK from entry sizes: the index goes out first and payloads are
+    # then copied in order, so no entry has to be held in memory.
+
+    def __init__(self) -> None:
+        self._entries: List[Tuple[str, int, Callable[[IO[bytes]], int]]] = []
+
+    def add_bytes(self, fname: str, data: bytes) -> None:
+        self._entries.append((fname, len(data), lambda output: output.write(data)))
+
+    def add_file(self, fname: str, path: str) -> None:
+        size = os.path.getsize(path)
 
+        def copy(output: IO[bytes]) -> int:
+            with open(path, 'rb') as source:
+                return copy_range(source, output, 0, size)
 
-def read_file_fallback(
-    pak: PairIterable[str, bytes],
+        self._entries.append((fname, size, copy))
+
+    def add_range(self, fname: str, source: IO[bytes], offset: int, size: int) -> None:
+        # copied straight from an open file, e.g. the PAK being rebuilt
+        self._entries.append(
+            (fname, size, lambda output: copy_range(source, output, offset, size))
+        )
+
+    def sizes(self) -> List[Tuple[str, int]]:
+        return [(fname, size) for fname, size, _ in self._entries]
+
+    def index(self) -> bytes:
+        return b''.join(generate_sized_index(self.sizes()))
+
+    def write_entries(
+        self, output: IO[bytes], start: int = 0, stop: Optional[int] = None
+    ) -> int:
+        total = 0
+        for fname, size, copy in self._entries[start:stop]:
+            written = copy(output)
+            if written != size:
+                raise EOFError(f'{fname}: expected {size} bytes but copied {written}')
+            total += written
+        return total
+
+    def write(self, output: IO[bytes]) -> int:
+        index = self.index()
+        output.write(index)
+        return len(index) + self.write_entries(output)
+
+
+def add_pak_entries(
+    writer: PakWriter,
+    source: IO[bytes],
+    pak: pakfile.PakFile,
     pakname: str,
-) -> PairIterator[str, bytes]:
-    for fname, data in pak:
+) -> None:
+    # replacements found in the pakname directory, the rest from the source PAK
+    for fname, (offset, size) in pak.index.items():
         fpath = os.path.join(pakname, fname)
         if os.path.exists(fpath):
             logging.info(f'Adding {fpath}')
-            with open(fpath, 'rb') as src:
-                data = src.read()
-        yield fname, data
+            writer.add_file(fname, fpath)
+        else:
+            writer.add_range(fname, source, offset, size)
+
+
+def digest_range(stream: IO[bytes], offset: int, size: int) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    stream.seek(offset, io.SEEK_SET)
+    while size > 0:
+        chunk = stream.read(min(COPY_CHUNK_SIZE, size))
+        if not chunk:
+            break
+        digest.update(chunk)
+        size -= len(chunk)
+    return digest.digest()
+
+
+def is_modified(fpath: str, pak: IO[bytes], offset: int, size: int) -> bool:
+    if os.path.getsize(fpath) != size:
+        return True
+    with open(fpath, 'rb') as src:
+        return digest_range(src, 0, size) != digest_range(pak, offset, size)
+
+
+def overwrite_entries(
+    writer: PakWriter,
+    pak: IO[bytes],
+    offs: Sequence[int],
+    changed: Iterable[int],
+    stop: Optional[int] = None,
+) -> None:
+    # entries before stop keep their place, only their payload is replaced
+    for idx in changed:
+        if stop is not None and idx >= stop:
+            break
+        pak.seek(offs[idx], io.SEEK_SET)
+        writer.write_entries(pak, idx, idx + 1)
+
+
+def patch_pak(path: str, pakname: str) -> List[str]:
+    # Applies replacements from the pakname directory to the PAK at path.
+    # Same-size changes are overwritten in place; from the first entry whose
+    # size changes the tail is rewritten along with the index. A PAK with an
+    # index layout other than ours is rebuilt in full instead.
+    with open(path, 'r+b') as pak:
+        names, offs = pakfile.read_index_entries(pak)
+        writer = PakWriter()
+        changed = []
+        first_moved = None
+        for idx, (fname, offset, end) in enumerate(zip(names, offs, offs[1:])):
+            size = end - offset
+            fpath = os.path.join(pakname, fname)
+            if os.path.exists(fpath) and is_modified(fpath, pak, offset, size):
+                logging.info(f'Patching {fpath}')
+                writer.add_file(fname, fpath)
+                changed.append(idx)
+                if first_moved is None and os.path.getsize(fpath) != size:
+                    first_moved = idx
+            else:
+                writer.add_range(fname, pak, offset, size)
+
+        if not changed:
+            return []
+
+        index = writer.index()
+        if len(index) == offs[0]:
+            if first_moved is None:
+                overwrite_entries(writer, pak, offs, changed)
+                return [names[idx] for idx in changed]
+
+            tmpdir = os.path.dirname(os.path.abspath(path))
+            with tempfile.TemporaryFile(dir=tmpdir) as tail:
+                # later entries overlap their new place, so the tail is staged
+                # first, which also reads all of it before the PAK is touched
+                size = writer.write_entries(tail, first_moved)
+                overwrite_entries(writer, pak, offs, changed, first_moved)
+                pak.seek(offs[first_moved], io.SEEK_SET)
+                copy_range(tail, pak, 0, size)
+                pak.truncate()
+            pak.seek(0, io.SEEK_SET)
+            pak.write(index)
+            return [names[idx] for idx in changed]
+
+        logging.info(f'Rebuilding {path}')
+        try:
+            with open(path + '.tmp', 'wb') as output:
+                writer.write(output)
+        except BaseException:
+            os.remove(path + '.tmp')
+            raise
+    os.replace(path + '.tmp', path)
+    return [names[idx] for idx in changed]
 
 
 if __name__ == '__main__':
-    import os
+    import argparse
     import glob
-    import sys
 
-    if len(sys.argv) < 2:
-        print('Usage: pakfile.py PATH_TO_KYRANDIA')
-        exit(1)
+    parser = argparse.ArgumentParser(description='rebuild pak archives')
+    parser.add_argument('srcdir', help='directory with replacement files')
+    parser.add_argument('files', nargs='+', help='pak files to rebuild')
+    parser.add_argument(
+        '--patch',
+        action='store_true',
+        help='update previously built archives in out/ in place',
+    )
+    args = parser.parse_args()
 
-    # TODO: use argparse
-    srcdir = sys.argv[1]
-    kyrapath = sys.argv[2:]
-    files = sorted(set(chain.from_iterable(glob.iglob(r) for r in kyrapath)))
+    files = sorted(set(chain.from_iterable(glob.iglob(r) for r in args.files)))
 
     for filename in files:
         dirname = os.path.basename(filename)
-        with pakfile.open(filename) as pak:
-            index, data = zip(*generate_index(read_file_fallback(pak, srcdir)))
-        with open(os.path.join('out', dirname), 'wb') as output:
-            output.write(b''.join(index))
-            output.write(b''.join(data))
+        target = os.path.join('out', dirname)
+        if args.patch and os.path.exists(target):
+            patched = patch_pak(target, args.srcdir)
+            logging.info(f'{target}: {len(patched)} entries patched')
+            continue
+        with open(filename, 'rb') as source, pakfile.open(source) as pak:
+            writer = PakWriter()
+            add_pak_entries(writer, source, pak, args.srcdir)
+            with open(target, 'wb') as output:
+                writer.write(output)
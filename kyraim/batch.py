@@ -0,0 +1,132 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+from PIL import Image
+
+from kyraim.texts import ArchiveLocation, open_location
+
+
+# relative output path and file content
+Outputs = List[Tuple[str, bytes]]
+
+
+class WorkItem(NamedTuple):
+    location: ArchiveLocation
+    fname: str
+    palettes: Tuple[Tuple[str, bytes], ...]
+
+
+Converter = Callable[[IO[bytes], WorkItem], Outputs]
+
+
+PNG_ENCODERS = min(4, os.cpu_count() or 1)
+
+_encoder_pool: Optional[Tuple[int, ThreadPoolExecutor]] = None
+
+# archives opened by this process, kept open for the lifetime of the worker
+_open_archives: Dict[ArchiveLocation, Any] = {}
+_archive_stack = ExitStack()
+
+
+def worker_archive(location: ArchiveLocation) -> Any:
+    archive = _open_archives.get(location)
+    if archive is None:
+        archive = _archive_stack.enter_context(open_location(location))
+        _open_archives[location] = archive
+    return archive
+
+
+def close_archives() -> None:
+    _open_archives.clear()
+    _archive_stack.close()
+
+
+def encode_png(im: Image.Image) -> bytes:
+    with io.BytesIO() as out:
+        im.save(out, format='PNG')
+        return out.getvalue()
+
+
+def encoder_pool() -> ThreadPoolExecutor:
+    # per process, a pool inherited through fork would have no threads
+    global _encoder_pool
+    pid = os.getpid()
+    if _encoder_pool is None or _encoder_pool[0] != pid:
+        _encoder_pool = (pid, ThreadPoolExecutor(PNG_ENCODERS))
+    return _encoder_pool[1]
+
+
+def encode_png_variants(
+    pixels: np.ndarray, variants: Sequence[Tuple[str, bytes]]
+) -> Outputs:
+    # One indexed image saved under several palettes. Every variant maps the
+    # same pixel buffer and the encoders run on threads, as Pillow releases
+    # the GIL while compressing.
+    data = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width = data.shape
+
+    def encode(variant: Tuple[str, bytes]) -> Tuple[str, bytes]:
+        name, palette = variant
+        im = Image.frombuffer('P', (width, height), data, 'raw', 'P', 0, 1)
+        im.putpalette(palette)
+        return name, encode_png(im)
+
+    if len(variants) < 2 or PNG_ENCODERS < 2:
+        return [encode(variant) for variant in variants]
+    return list(encoder_pool().map(encode, variants))
+
+
+def run_item(convert: Converter, item: WorkItem) -> Outputs:
+    archive = worker_archive(item.location)
+    with archive.open(item.fname, 'rb') as stream:
+        return convert(stream, item)
+
+
+def run_batch(
+    items: Sequence[WorkItem], convert: Converter, workers: int = 1
+) -> Iterator[Tuple[WorkItem, Outputs]]:
+    # `convert` must be a module level function (or a partial of one) so it
+    # can be sent to worker processes; results come back in plan order
+    task = partial(run_item, convert)
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            yield from zip(items, executor.map(task, items))
+        return
+
+    try:
+        for item in items:
+            yield item, task(item)
+    finally:
+        close_archives()
+
+
+def write_outputs(
+    results: Iterator[Tuple[WorkItem, Outputs]],
+    dirname: Union[str, 'os.PathLike[str]'],
+) -> int:
+    written = 0
+    for _, outputs in results:
+        for name, data in outputs:
+            path = Path(dirname) / name
+            os.makedirs(path.parent, exist_ok=True)
+            path.write_bytes(data)
+            written += 1
+    return written
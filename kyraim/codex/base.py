@@ -1,14 +1,31 @@
-from functools import partial, wraps
-from itertools import chain, takewhile
-import operator
-from typing import Callable, Iterable, Optional, Protocol, TypeVar, Union, cast
+from contextlib import contextmanager
+from functools import wraps
+import io
+import struct
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from typing_extensions import ParamSpec
+import weakref
+
+if TYPE_CHECKING:
+    import numpy as np
 
 ItemT = TypeVar('ItemT')
 ResultT = TypeVar('ResultT')
 ArgsP = ParamSpec('ArgsP')
 ReadT = TypeVar('ReadT', covariant=True)
 BufferLike = Union[bytes, bytearray, memoryview]
+WritableBuffer = Union[bytearray, memoryview, 'np.ndarray']
 
 
 class SupportsRead(Protocol[ReadT]):
@@ -37,6 +54,41 @@ def collect(
     return decorator
 
 
+def writable_view(buffer: WritableBuffer) -> Union[bytearray, memoryview]:
+    if isinstance(buffer, bytearray):
+        return buffer
+    if isinstance(buffer, memoryview):
+        return buffer.cast('B')
+    # numpy arrays expose their memory as a (possibly multidimensional) view
+    return buffer.data.cast('B')
+
+
+# data of streams without a buffer, read once from where decoding first started
+# and reused while later decodes start inside it
+_read_ahead: 'weakref.WeakKeyDictionary[SupportsRead[bytes], Tuple[int, bytes]]' = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@contextmanager
+def stream_buffer(stream: SupportsRead[bytes]) -> Iterator[Tuple[BufferLike, int]]:
+    # yields a buffer holding the unread data of stream and the offset it starts at
+    # (streams over memory, BytesIO and archive entries, expose it without a copy,
+    # the view is released on exit so the stream can be resized or closed again)
+    getbuffer = getattr(stream, 'getbuffer', None)
+    if getbuffer is not None:
+        with getbuffer() as view:
+            yield view, stream.tell()
+        return
+    pos = stream.tell()
+    cached = _read_ahead.get(stream)
+    if cached is None or not cached[0] <= pos <= cached[0] + len(cached[1]):
+        cached = pos, stream.read()
+        _read_ahead[stream] = cached
+    start, data = cached
+    yield data, pos - start
+
+
 def read_int8(stream: SupportsRead[bytes]) -> int:
     return int.from_bytes(stream.read(1), byteorder='big', signed=True)
 
@@ -53,24 +105,71 @@ def read_uint32_le(stream: SupportsRead[bytes]) -> int:
     return int.from_bytes(stream.read(4), byteorder='little', signed=False)
 
 
+def _read_array(stream: SupportsRead[bytes], fmt: str, count: int) -> Tuple[int, ...]:
+    table = struct.Struct(fmt[0] + str(count) + fmt[1])
+    return table.unpack(stream.read(table.size))
+
+
+def read_uint16_le_array(stream: SupportsRead[bytes], count: int) -> Tuple[int, ...]:
+    return _read_array(stream, '<H', count)
+
+
+def read_uint16_be_array(stream: SupportsRead[bytes], count: int) -> Tuple[int, ...]:
+    return _read_array(stream, '>H', count)
+
+
+def read_uint32_le_array(stream: SupportsRead[bytes], count: int) -> Tuple[int, ...]:
+    return _read_array(stream, '<I', count)
+
+
+CSTR_BLOCK_SIZE = 64
+
+
+def _scan_cstr(stream: SupportsRead[bytes]) -> Tuple[bytes, bool]:
+    # read blocks until null-termination and seek back to right after it
+    parts: List[bytes] = []
+    while True:
+        block = stream.read(CSTR_BLOCK_SIZE)
+        if not block:
+            return b''.join(parts), False
+        end = block.find(b'\00')
+        if end >= 0:
+            stream.seek(end + 1 - len(block), io.SEEK_CUR)
+            parts.append(block[:end])
+            return b''.join(parts), True
+        parts.append(block)
+
+
 def readcstr(stream: SupportsRead[bytes]) -> bytes:
-    return b''.join(iter(partial(stream.read, 1), b'\00'))
+    return _scan_cstr(stream)[0]
 
 
 def bound_readcstr(stream: SupportsRead[bytes]) -> bytes:
-    return b''.join(
-        takewhile(partial(operator.ne, b'\00'), iter(partial(stream.read, 1), b''))
-    )
+    return _scan_cstr(stream)[0]
 
 
 def safe_readcstr(stream: SupportsRead[bytes]) -> bytes:
-    try:
-        bound_read = cast(
-            Iterable[bytes], chain(iter(partial(stream.read, 1), b''), [None])
-        )
-        return b''.join(takewhile(partial(operator.ne, b'\00'), bound_read))
-    except TypeError:
+    text, terminated = _scan_cstr(stream)
+    if not terminated:
         raise EOFError('Expected null-termination but reached EOF')
+    return text
+
+
+def split_cstrs(
+    buffer: BufferLike,
+    offsets: Optional[Iterable[int]] = None,
+) -> List[bytes]:
+    # all null-terminated strings in buffer, or only those starting at offsets
+    data = bytes(buffer)
+    if offsets is None:
+        return data.split(b'\00')[:-1]
+    texts = []
+    for off in offsets:
+        end = data.find(b'\00', off)
+        if end < 0:
+            raise EOFError('Expected null-termination but reached EOF')
+        texts.append(data[off:end])
+    return texts
 
 
 def write_uint16_be(number: int) -> bytes:
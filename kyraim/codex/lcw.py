@@ -1,68 +1,125 @@
-from typing import IO
-
-from kyraim.codex.base import BufferLike, read_uint16_le
-
+from typing import IO, Dict, Mapping, Optional, Union
+
+from kyraim.codex.base import (
+    BufferLike,
+    WritableBuffer,
+    stream_buffer,
+    writable_view,
+)
+
+
+def _copy_back(
+    out: Union[bytearray, memoryview],
+    current: int,
+    src: int,
+    ln: int,
+) -> None:
+    end = src + ln
+    if end <= current or src >= current:
+        out[current : current + ln] = out[src:end]
+        return
+    # overlapping reference repeats the bytes between src and current
+    pattern = bytes(out[src:current])
+    reps, rest = divmod(ln, len(pattern))
+    out[current : current + ln] = pattern * reps + pattern[:rest]
+
+
+def decode_lcw_buffer(
+    src: BufferLike,
+    buffer: WritableBuffer,
+    size: int,
+    pos: int = 0,
+) -> int:
+    out = writable_view(buffer)
+
+    # streams for buffers above 64 KiB start with 0 and use relative offsets
+    relative = pos < len(src) and src[pos] == 0
+    if relative:
+        pos += 1
 
-def decode_lcw(stream: IO[bytes], buffer: BufferLike, size: int) -> bytes:
-    out = bytearray(buffer)
     current = 0
-    while True:
-        # print(current)
+    while current < size:
         count = size - current
 
-        if count == 0:
-            # TODO: check if can be removed (side effect of trailing byte 0x80)
-            break
-
-        code = stream.read(1)[0]
+        code = src[pos]
+        pos += 1
         if code == 0x80:
             break
 
-        # print('CODE', code)
         if not (code & 0x80):
-            # print('RELATIVE')
             ln = min(count, (code >> 4) + 3)
-            offs = ((code & 0xF) << 8) + stream.read(1)[0]
-            # print(f'len = {ln} offs = {offs}')
-            dst_offs = current - offs
-            # print('DST_OFFS', dst_offs)
-            # print(len(out), current, offs, dst_offs, out[dst_offs : dst_offs + ln])
-            # assert current >= dst_offs + ln, (current, dst_offs)
-            # out[current:current+ln] = out[dst_offs:dst_offs+ln]
-            for i in range(ln):
-                out[current + i] = out[dst_offs + i]
+            offs = ((code & 0xF) << 8) | src[pos]
+            pos += 1
+            if offs:
+                _copy_back(out, current, current - offs, ln)
             current += ln
         elif code & 0x40:
-            # print('SECOND')
-            ln = min(count, (code & 0x3F) + 3)
             if code == 0xFE:
-                ln = min(count, read_uint16_le(stream))
-                out[current : current + ln] = stream.read(1) * ln
-                current += ln
+                ln = min(count, src[pos] | (src[pos + 1] << 8))
+                out[current : current + ln] = bytes(src[pos + 2 : pos + 3]) * ln
+                pos += 3
             else:
-                # print('ABS')
                 if code == 0xFF:
-                    ln = min(count, read_uint16_le(stream))
-                offs = read_uint16_le(stream)
-                dst_offs = offs
-                # assert current >= dst_offs + ln, (current, dst_offs, ln)
-                # out[current:current+ln] = out[dst_offs:dst_offs+ln]
-                for i in range(ln):
-                    out[current + i] = out[dst_offs + i]
-                current += ln
+                    ln = min(count, src[pos] | (src[pos + 1] << 8))
+                    pos += 2
+                else:
+                    ln = min(count, (code & 0x3F) + 3)
+                offs = src[pos] | (src[pos + 1] << 8)
+                pos += 2
+                _copy_back(out, current, current - offs if relative else offs, ln)
+            current += ln
         else:
-            assert code != 0x80
             ln = min(count, code & 0x3F)
-            out[current : current + ln] = stream.read(ln)
+            out[current : current + ln] = src[pos : pos + ln]
+            pos += ln
             current += ln
+    return pos
+
+
+def decode_lcw_into(stream: IO[bytes], out: WritableBuffer, size: int) -> None:
+    start = stream.tell()
+    with stream_buffer(stream) as (src, offset):
+        end = decode_lcw_buffer(src, out, size, offset) - offset
+    stream.seek(start + end)
+
+
+def decode_lcw(stream: IO[bytes], buffer: BufferLike, size: int) -> bytes:
+    out = bytearray(buffer)
+    decode_lcw_into(stream, out, size)
     return bytes(out)
 
 
 UINT16_MAX = (2**16) - 1
 
+# maximal number of hash chain candidates checked per position
+EFFORT_LEVELS: Mapping[str, Optional[int]] = {
+    'fast': 8,
+    'default': 256,
+    'max': None,
+}
+
+
+def _match_length(buffer: bytes, src: int, pos: int, limit: int) -> int:
+    ln = 0
+    step = 8
+    while ln < limit:
+        step = min(step, limit - ln)
+        if buffer[src + ln : src + ln + step] == buffer[pos + ln : pos + ln + step]:
+            ln += step
+            step *= 2
+        elif step > 1:
+            step //= 2
+        else:
+            break
+    return ln
 
-def encode_lcw(buffer: BufferLike) -> bytes:
 
+def encode_lcw(buffer: BufferLike, effort: str = 'default') -> bytes:
+    if effort not in EFFORT_LEVELS:
+        raise ValueError(f'unknown effort level {effort}')
+    depth = EFFORT_LEVELS[effort]
+
+    buffer = bytes(buffer)
     size = len(buffer)
     pos = 0
     out = bytearray()
@@ -71,6 +128,11 @@ def encode_lcw(buffer: BufferLike) -> bytes:
     if relative:
         out += bytes([0])
 
+    # hash chains of 3-byte prefixes, most recent position first
+    head: Dict[bytes, int] = {}
+    chain = [-1] * size
+    inserted = 0
+
     cmd_onep = len(out)
     out += bytes([0x81, buffer[pos]])
     pos += 1
@@ -79,48 +141,47 @@ def encode_lcw(buffer: BufferLike) -> bytes:
     while pos < size:
         if size - pos > 64 and buffer[pos] == buffer[pos + 64]:
             rlemax = size if size - pos < UINT16_MAX else pos + UINT16_MAX
-
-            rlep = pos + 1
-            while rlep < rlemax and buffer[rlep] == buffer[pos]:
-                rlep += 1
-
-            run_length = rlep - pos
-            assert run_length % UINT16_MAX == run_length
+            run_length = 1 + _match_length(buffer, pos, pos + 1, rlemax - pos - 1)
+            assert run_length <= UINT16_MAX
 
             if run_length >= 0x41:
                 cmd_one = False
                 out += bytes(
                     [0xFE, run_length & 0xFF, (run_length >> 8) & 0xFF, buffer[pos]]
                 )
-                pos = rlep
+                pos += run_length
                 continue
 
-        block_size = 0
-        if relative:
-            offstart = 0 if pos < UINT16_MAX else pos - UINT16_MAX
-        else:
-            offstart = 0
+        for ipos in range(inserted, min(pos, size - 2)):
+            key = buffer[ipos : ipos + 3]
+            chain[ipos] = head.get(key, -1)
+            head[key] = ipos
+        inserted = max(inserted, pos)
 
-        offchk = offstart
+        block_size = 0
         offsetp = pos
-        while offchk < pos:
-            while offchk < pos and buffer[offchk] != buffer[pos]:
-                offchk += 1
-
-            if offchk >= pos:
-                break
-
-            i = 1
-            while pos + i < size:
-                if buffer[offchk + i] != buffer[pos + i]:
-                    break
-                i += 1
-
-            if i >= block_size:
-                block_size = i
-                offsetp = offchk
-
-            offchk += 1
+        if pos + 2 < size:
+            if relative:
+                offstart = 0 if pos < UINT16_MAX else pos - UINT16_MAX
+            else:
+                offstart = 0
+
+            limit = min(size - pos, UINT16_MAX)
+            tries = depth
+            offchk = head.get(buffer[pos : pos + 3], -1)
+            while offchk >= offstart:
+                if buffer[offchk + block_size] == buffer[pos + block_size]:
+                    i = _match_length(buffer, offchk, pos, limit)
+                    if i > block_size:
+                        block_size = i
+                        offsetp = offchk
+                        if block_size == limit:
+                            break
+                if tries is not None:
+                    tries -= 1
+                    if not tries:
+                        break
+                offchk = chain[offchk]
 
         if block_size <= 2:
             if cmd_one and out[cmd_onep] < 0xBF:
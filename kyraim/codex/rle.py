@@ -0,0 +1,158 @@
+from typing import IO, List, Tuple, Union
+
+import numpy as np
+
+from kyraim.codex.base import (
+    BufferLike,
+    WritableBuffer,
+    stream_buffer,
+    writable_view,
+)
+
+
+RLE_LITERAL_MAX = 0x7F
+RLE_SHORT_MAX = 0x80
+RLE_LONG_MAX = 0xFFFF
+
+# below this average output per code, numpy setup costs more than slicing
+RLE_SLICE_MIN_AVERAGE = 16
+
+
+def _find_codes(src: BufferLike, size: int, pos: int) -> Tuple[List[int], int]:
+    # positions of the codes needed to produce size bytes, and where they end
+    starts: List[int] = []
+    add = starts.append
+    dst = 0
+    while dst < size:
+        code = src[pos]
+        add(pos)
+        if code > RLE_LITERAL_MAX:
+            dst += 0x100 - code
+            pos += 2
+        elif code:
+            dst += code
+            pos += code + 1
+        else:
+            dst += (src[pos + 1] << 8) | src[pos + 2]
+            pos += 4
+    return starts, pos
+
+
+def _fill_slices(
+    src: BufferLike, out: Union[bytearray, memoryview], starts: List[int], size: int
+) -> None:
+    dst = 0
+    for pos in starts:
+        code = src[pos]
+        if code > RLE_LITERAL_MAX:
+            ln = min(0x100 - code, size - dst)
+            out[dst : dst + ln] = bytes(src[pos + 1 : pos + 2]) * ln
+        elif code:
+            ln = min(code, size - dst)
+            out[dst : dst + ln] = src[pos + 1 : pos + 1 + ln]
+        else:
+            ln = min((src[pos + 1] << 8) | src[pos + 2], size - dst)
+            out[dst : dst + ln] = bytes(src[pos + 3 : pos + 4]) * ln
+        dst += ln
+
+
+def _expand(src: BufferLike, starts: List[int], pos: int, end: int) -> np.ndarray:
+    # Keeps the data bytes of the compressed span (literals and run values)
+    # with a repeat count each, one for literals and the run length for runs,
+    # and expands all of them with a single np.repeat.
+    data = np.frombuffer(src, dtype=np.uint8, count=end - pos, offset=pos)
+    codes_at = np.array(starts, dtype=np.int64) - pos
+    codes = data[codes_at]
+
+    literal = (codes != 0) & (codes <= RLE_LITERAL_MAX)
+    lit_at = codes_at[literal] + 1
+    marks = np.zeros(len(data) + 1, dtype=np.int8)
+    marks[lit_at] = 1
+    marks[lit_at + codes[literal]] = -1
+    keep = np.cumsum(marks[:-1], dtype=np.int8).astype(bool)
+
+    counts = np.ones(len(data), dtype=np.int64)
+    short = codes > RLE_LITERAL_MAX
+    short_at = codes_at[short] + 1
+    keep[short_at] = True
+    counts[short_at] = 0x100 - codes[short].astype(np.int64)
+
+    long_at = codes_at[codes == 0]
+    keep[long_at + 3] = True
+    long_lengths = data[long_at + 1].astype(np.int64) << 8 | data[long_at + 2]
+    counts[long_at + 3] = long_lengths
+
+    return np.repeat(data[keep], counts[keep])
+
+
+def decode_rle_buffer(
+    src: BufferLike,
+    buffer: WritableBuffer,
+    size: int,
+    pos: int = 0,
+) -> int:
+    out = writable_view(buffer)
+    starts, end = _find_codes(src, size, pos)
+    if len(starts) * RLE_SLICE_MIN_AVERAGE >= size:
+        # the last code may run past size, it is clamped like the slices are
+        out[:size] = _expand(src, starts, pos, end)[:size].tobytes()
+    else:
+        _fill_slices(src, out, starts, size)
+    return end
+
+
+def decode_rle_into(stream: IO[bytes], target: WritableBuffer, size: int) -> None:
+    start = stream.tell()
+    with stream_buffer(stream) as (src, offset):
+        end = decode_rle_buffer(src, target, size, offset) - offset
+    stream.seek(start + end)
+
+
+def decode_rle(stream: IO[bytes], size: int) -> bytes:
+    buffer = bytearray(size)
+    decode_rle_into(stream, buffer, size)
+    return bytes(buffer)
+
+
+def _find_runs(data: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # starts and lengths of runs worth a fill code, split at the longest code
+    changes = np.flatnonzero(np.diff(data)) + 1
+    starts: np.ndarray = np.concatenate((np.zeros(1, dtype=changes.dtype), changes))
+    lengths = np.diff(np.append(starts, len(data)))
+
+    pieces = (lengths + RLE_LONG_MAX - 1) // RLE_LONG_MAX
+    if len(pieces) and pieces.max() > 1:
+        first = np.repeat(np.cumsum(pieces) - pieces, pieces)
+        step = np.arange(len(first)) - first
+        starts = np.repeat(starts, pieces) + step * RLE_LONG_MAX
+        lengths = np.repeat(lengths, pieces) - step * RLE_LONG_MAX
+        lengths = np.minimum(lengths, RLE_LONG_MAX)
+
+    fills = lengths > 2
+    return starts[fills], lengths[fills]
+
+
+def encode_rle(buffer: BufferLike) -> bytes:
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    src = bytes(buffer)
+    run_starts, run_lengths = _find_runs(data)
+
+    out = bytearray()
+    pos = 0
+    for start, ln in zip(run_starts.tolist() + [len(src)], run_lengths.tolist() + [0]):
+        # bytes between runs go out as literals
+        for lit in range(pos, start, RLE_LITERAL_MAX):
+            chunk = src[lit : min(lit + RLE_LITERAL_MAX, start)]
+            out.append(len(chunk))
+            out += chunk
+        if not ln:
+            break
+        value = src[start : start + 1]
+        if ln > RLE_SHORT_MAX:
+            out.append(0)
+            out += ln.to_bytes(2, byteorder='big')
+        else:
+            out.append(0x100 - ln)
+        out += value
+        pos = start + ln
+    return bytes(out)
@@ -11,7 +11,8 @@ from kyraim.codex.base import (
     SupportsRead,
     collect,
     read_uint16_le,
-    readcstr,
+    read_uint16_le_array,
+    split_cstrs,
     write_uint16_le,
 )
 
@@ -89,10 +90,14 @@ def decode2_escaped(src: bytes) -> bytes:
 def parse(stream: SupportsRead[bytes]) -> Iterator[bytes]:
     first = read_uint16_le(stream)
     stream.seek(-2, 1)
-    offs = [read_uint16_le(stream) for _ in range(first // 2)]
-    for off in offs:
-        assert stream.tell() == off, (stream.tell(), off)
-        yield decode2(decode1(readcstr(stream)))
+    offs = read_uint16_le_array(stream, first // 2)
+    pos = stream.tell()
+    texts = split_cstrs(stream.read())
+    assert len(texts) >= len(offs), (len(texts), len(offs))
+    for off, text in zip(offs, texts):
+        assert pos == off, (pos, off)
+        pos += len(text) + 1
+        yield decode2(decode1(text))
 
 
 def compose(
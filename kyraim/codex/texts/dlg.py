@@ -6,7 +6,12 @@ import os
 from itertools import chain, groupby
 from typing import IO, Iterable, Iterator, Sequence, Tuple
 
-from kyraim.codex.base import SupportsRead, read_uint16_le, write_uint16_le
+from kyraim.codex.base import (
+    SupportsRead,
+    read_uint16_le,
+    read_uint16_le_array,
+    write_uint16_le,
+)
 
 
 def parse(stream: SupportsRead[bytes]) -> Iterator[Tuple[int, int, int, bytes]]:
@@ -23,7 +28,7 @@ def parse(stream: SupportsRead[bytes]) -> Iterator[Tuple[int, int, int, bytes]]:
 
     first_off = read_uint16_le(stream)
     num_entries = (first_off - stream.tell()) // 2
-    offs = [first_off] + [read_uint16_le(stream) for _ in range(num_entries)]
+    offs = [first_off, *read_uint16_le_array(stream, num_entries)]
 
     assert stream.tell() == offs[0], (stream.tell(), offs[0])
 
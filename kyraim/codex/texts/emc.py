@@ -2,8 +2,7 @@ import csv
 import glob
 
 from chunk import Chunk
-from itertools import chain, takewhile
-from functools import partial
+from itertools import chain
 import itertools
 import operator
 import os
@@ -13,7 +12,8 @@ from typing import IO, Iterable, Iterator, Sequence, cast
 from kyraim.codex.base import (
     SupportsRead,
     read_uint16_be,
-    readcstr,
+    read_uint16_be_array,
+    split_cstrs,
     write_uint16_be,
     write_uint32_be,
 )
@@ -29,10 +29,6 @@ def read_chunks(stream: SupportsRead[bytes], **kwargs) -> Iterator[Chunk]:
         chunk.skip()
 
 
-def before_offset(stream: SupportsRead[bytes], offset: int, *args) -> bool:
-    return stream.tell() <= offset
-
-
 def parse(stream: SupportsRead[bytes]) -> Iterator[bytes]:
     form = Chunk(cast(IO[bytes], stream))
     assert form.getname() == b'FORM'
@@ -41,15 +37,11 @@ def parse(stream: SupportsRead[bytes]) -> Iterator[bytes]:
         chunk.seek(0)
         if chunk.getname() == b'TEXT':
             start = read_uint16_be(chunk)
-            read_offsets = iter(partial(read_uint16_be, chunk), b'')
-            offs = list(takewhile(partial(before_offset, chunk, start), read_offsets))
-            chunk.seek(-2, 1)
+            offs = list(read_uint16_be_array(chunk, start // 2 - 1))
             assert chunk.tell() == start
             assert offs == sorted(offs)
-            for off in chain([start], offs):
-                # assert chunk.tell() == off, (chunk.tell(), off)
-                chunk.seek(off)
-                yield readcstr(chunk)
+            chunk.seek(0)
+            yield from split_cstrs(chunk.read(), chain([start], offs))
 
 
 def wrap_chunk(tag: bytes, data: bytes, size_fix: int = 0):
@@ -80,14 +72,12 @@ def compose(
                 chunk.seek(0)
                 if chunk.getname() == b'TEXT':
                     start = read_uint16_be(chunk)
-                    read_offsets = iter(partial(read_uint16_be, chunk), b'')
-                    orig_offs = list(
-                        takewhile(partial(before_offset, chunk, start), read_offsets)
-                    )
+                    orig_offs = list(read_uint16_be_array(chunk, start // 2 - 1))
 
-                    for off in chain([start], orig_offs):
-                        chunk.seek(off)
-                        print('ORIG', fname, f'{readcstr(chunk)!r}', sep='\t')
+                    chunk.seek(0)
+                    orig_texts = split_cstrs(chunk.read(), chain([start], orig_offs))
+                    for orig_text in orig_texts:
+                        print('ORIG', fname, f'{orig_text!r}', sep='\t')
 
                     base = len(lines_in_group) * 2
 
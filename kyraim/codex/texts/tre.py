@@ -7,13 +7,18 @@ import os
 from itertools import chain, groupby
 from typing import IO, Iterable, Iterator, Sequence, Tuple
 
-from kyraim.codex.base import read_uint16_le, readcstr, write_uint16_le
+from kyraim.codex.base import (
+    read_uint16_le,
+    read_uint16_le_array,
+    readcstr,
+    write_uint16_le,
+)
 
 
 def parse(stream: IO[bytes]) -> Iterator[Tuple[int, bytes, bytes]]:
     table_entries = read_uint16_le(stream)
-    index_table = [read_uint16_le(stream) for _ in range(table_entries)]
-    offsets = [read_uint16_le(stream) for _ in range(table_entries)]
+    index_table = read_uint16_le_array(stream, table_entries)
+    offsets = read_uint16_le_array(stream, table_entries)
     for idx, off in zip(index_table, offsets):
         meta = stream.read(off - stream.tell())
         assert stream.tell() == off, (stream.tell(), off)
@@ -30,10 +35,7 @@ def compose(
     for tfname, group in grouped:
         basename = os.path.basename(tfname)
         _, idcs, hmetas, outs = zip(*group)
-        texts = [
-            out.replace('`', '"').encode(encoding) + b'\0'
-            for out in outs
-        ]
+        texts = [out.replace('`', '"').encode(encoding) + b'\0' for out in outs]
         num_entries = len(texts)
         first_off = 2 + (num_entries) * 4
 
@@ -63,7 +65,14 @@ def write_parsed(
     for idx, line, meta in parse(instream):
         text = line.decode('cp862').replace('"', '""')
         assert '\n' not in text
-        print(os.path.basename(filename), idx, meta.hex(), f'"{text}"', sep='\t', file=outstream)
+        print(
+            os.path.basename(filename),
+            idx,
+            meta.hex(),
+            f'"{text}"',
+            sep='\t',
+            file=outstream,
+        )
 
 
 if __name__ == '__main__':
@@ -1,41 +1,70 @@
-import io
+from typing import List, Tuple
 
-from kyraim.codex.base import BufferLike, read_uint16_le
+import numpy as np
 
+from kyraim.codex.base import BufferLike, WritableBuffer, writable_view
 
-def decompress_xor_buffer(buffer: BufferLike) -> bytes:
-    src = bytes(buffer)
-
-    output = bytearray()
-    with io.BytesIO(src) as stream:
-        while True:
-            code = stream.read(1)[0]
-            # print('XOR CODE', code)
-            if code == 0:
-                ln = stream.read(1)[0]
-                output += stream.read(1) * ln
-
-            elif code & 0x80:
-                code -= 0x80
-                if code != 0:
-                    output += b'\x00' * code
-                else:
-                    subcode = read_uint16_le(stream)
-                    if subcode == 0:
-                        break
-                    elif subcode & 0x8000:
-                        subcode -= 0x8000
-                        if subcode & 0x4000:
-                            ln = subcode - 0x4000
-                            output += stream.read(1) * ln
-                        else:
-                            output += stream.read(code)
-                    else:
-                        output += b'\x00' * subcode
+
+# one byte strings for every value, multiplied out to expand fills
+FILL_VALUES = [bytes((value,)) for value in range(256)]
+
+
+def _decode_parts(src: bytes) -> List[bytes]:
+    # the decoded pieces in order, callers join them in one go instead of
+    # growing the output for every code
+    parts: List[bytes] = []
+    add = parts.append
+    fills = FILL_VALUES
+    pos = 0
+    while True:
+        code = src[pos]
+        if code == 0:
+            add(fills[src[pos + 2]] * src[pos + 1])
+            pos += 3
+        elif code < 0x80:
+            pos += 1
+            add(src[pos : pos + code])
+            pos += code
+        elif code != 0x80:
+            add(b'\0' * (code - 0x80))
+            pos += 1
+        else:
+            subcode = src[pos + 1] | (src[pos + 2] << 8)
+            pos += 3
+            if subcode == 0:
+                return parts
+            elif subcode & 0xC000 == 0xC000:
+                add(fills[src[pos]] * (subcode - 0xC000))
+                pos += 1
+            elif subcode & 0x8000:
+                subcode -= 0x8000
+                add(src[pos : pos + subcode])
+                pos += subcode
             else:
-                output += stream.read(code)
+                add(b'\0' * subcode)
 
-        return bytes(output)
+
+def decompress_xor_into(buffer: BufferLike, target: WritableBuffer) -> int:
+    data = decompress_xor_buffer(buffer)
+    output = writable_view(target)
+    output[: len(data)] = data
+    return len(data)
+
+
+def decompress_xor_buffer(buffer: BufferLike) -> bytes:
+    return b''.join(_decode_parts(bytes(buffer)))
+
+
+def apply_xor_delta(buffer: BufferLike, frame: np.ndarray) -> int:
+    # decodes the delta and xors it into frame in a single operation over the
+    # range it covers, data past the end of frame is ignored
+    if not frame.flags.c_contiguous:
+        raise ValueError('frame must be a contiguous array')
+    delta = decompress_xor_buffer(buffer)
+    size = min(len(delta), frame.size)
+    target = frame.reshape(-1)
+    target[:size] ^= np.frombuffer(delta, dtype=np.uint8, count=size)
+    return len(delta)
 
 
 XOR_SMALL = 127
@@ -44,84 +73,69 @@ XOR_LARGE = 16383
 XOR_MAX = 32767
 
 
-def compress_xor_buffer(
-    buffer: BufferLike,
-    # orig
-) -> bytes:
-    size = len(buffer)
-    pos = 0
-    out = bytearray()
-    while pos < size:
-        # print(pos, size)
-        # assert orig[:len(out)] == out, (list(orig[:len(out)][-20:]), list(out[-20:]))
-        fill_count = 0
-        xor_count = 0
-        skip_count = 0
-
-        last_xor = buffer[pos]
-        testsp = pos
-
-        while testsp < size and buffer[testsp] != 0:
-            if buffer[testsp] == last_xor:
-                fill_count += 1
-                xor_count += 1
-            else:
-                if fill_count > 3:
-                    break
-                else:
-                    last_xor = buffer[testsp]
-                    fill_count = 1
-                    xor_count += 1
-            testsp += 1
-
-        fill_count = fill_count if fill_count > 3 else 0
-        xor_count -= fill_count
-        while xor_count != 0:
-            if xor_count < XOR_MED:
-                # print('xor_count.if')
-                count = min(xor_count, XOR_SMALL)
-                out += bytes([count])
-            else:
-                # print('xor_count.else')
-                count = min(xor_count, XOR_LARGE)
-                out += bytes([0x80, count, (count >> 8) | 0x80])
+XOR_SKIP, XOR_FILL, XOR_COPY = range(3)
 
-            while count != 0:
-                out += bytes([buffer[pos]])
-                pos += 1
-                count -= 1
-                xor_count -= 1
-
-        while fill_count != 0:
-            if fill_count <= XOR_MED:
-                # print('fill_count.if')
-                count = fill_count
-                out += bytes([0, count])
-            else:
-                # print('fill_count.else')
-                count = min(fill_count, XOR_LARGE)
-                out += bytes([0x80, count % 256, (count >> 8) | 0xC0])
-
-            out += bytes([buffer[pos]])
-            pos += count
-            fill_count -= count
-
-        while testsp < size and buffer[testsp] == 0:
-            skip_count += 1
-            testsp += 1
-
-        while skip_count != 0:
-            if skip_count < XOR_MED:
-                # print('skip_count.if')
-                count = min(skip_count, XOR_SMALL)
-                out += bytes([count | 0x80])
-            else:
-                count = min(skip_count, XOR_MAX)
-                # print('skip_count.else')
-                out += bytes([0x80, count % 256, count >> 8])
 
-            skip_count -= count
-            pos += count
+def _find_tokens(data: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # split into runs of equal bytes: zero runs are skipped, nonzero runs longer
+    # than 3 bytes are filled, and adjacent shorter runs are merged and copied
+    size = len(data)
+    changes = np.flatnonzero(data[1:] != data[:-1]) + 1
+    starts: np.ndarray = np.concatenate((np.zeros(1, dtype=changes.dtype), changes))
+    lengths = np.diff(np.append(starts, size))
+    kinds = np.full(len(starts), XOR_COPY)
+    kinds[lengths > 3] = XOR_FILL
+    kinds[data[starts] == 0] = XOR_SKIP
+
+    merged = np.ones(len(starts), dtype=bool)
+    merged[1:] = (kinds[1:] != XOR_COPY) | (kinds[:-1] != XOR_COPY)
+    starts = starts[merged]
+    kinds = kinds[merged]
+    lengths = np.diff(np.append(starts, size))
+    return kinds, starts, lengths
+
+
+def compress_xor_buffer(buffer: BufferLike) -> bytes:
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    out = bytearray()
+    if not len(data):
+        return bytes([0x80, 0, 0])
+
+    kinds, starts, lengths = _find_tokens(data)
+    src = data.tobytes()
+    for kind, pos, length in zip(kinds.tolist(), starts.tolist(), lengths.tolist()):
+        if kind == XOR_COPY:
+            while length != 0:
+                if length < XOR_MED:
+                    count = min(length, XOR_SMALL)
+                    out.append(count)
+                else:
+                    count = min(length, XOR_LARGE)
+                    out += bytes([0x80, count & 0xFF, (count >> 8) | 0x80])
+                out += src[pos : pos + count]
+                pos += count
+                length -= count
+
+        elif kind == XOR_FILL:
+            value = src[pos]
+            while length != 0:
+                if length <= XOR_MED:
+                    count = length
+                    out += bytes([0, count, value])
+                else:
+                    count = min(length, XOR_LARGE)
+                    out += bytes([0x80, count & 0xFF, (count >> 8) | 0xC0, value])
+                length -= count
+
+        else:
+            while length != 0:
+                if length < XOR_MED:
+                    count = min(length, XOR_SMALL)
+                    out.append(count | 0x80)
+                else:
+                    count = min(length, XOR_MAX)
+                    out += bytes([0x80, count & 0xFF, count >> 8])
+                length -= count
 
     out += bytes([0x80, 0, 0])
     return bytes(out)
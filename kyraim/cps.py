@@ -1,32 +1,100 @@
 import io
 import os
 from enum import IntEnum
+from functools import partial
 from pathlib import Path
-from typing import IO, Mapping, Optional, Sequence, Tuple, TypedDict
+from typing import IO, Mapping, NamedTuple, Optional, Sequence, Tuple, TypedDict
 
 import numpy as np
 from PIL import Image
 
-from kyraim.codex.base import read_int8, read_uint16_be, read_uint16_le, read_uint32_le
-from kyraim.codex.lcw import decode_lcw, encode_lcw
-from kyraim.texts import match_archive_files
+from kyraim.codex.base import read_uint16_le, read_uint32_le
+from kyraim.codex.lcw import decode_lcw, decode_lcw_into, encode_lcw
+from kyraim.codex.rle import decode_rle, decode_rle_into
+from kyraim.batch import (
+    Outputs,
+    WorkItem,
+    encode_png_variants,
+    run_batch,
+    write_outputs,
+)
+from kyraim.palette import PALETTE_SIZE, match_palettes, read_palette
+from kyraim.archive.cache import IndexCache
+from kyraim.texts import locate_archive_files, match_archive_files
 
 
 skip = False
 
 
 class Compression(IntEnum):
+    UNCOMPRESSED = 0
     LZW_12 = 1
     LZW_14 = 2
     RLE = 3
     LCW = 4
 
 
+CPS_WIDTH, CPS_HEIGHT = 320, 200
+
 # palette = [((53 + x) ** 2 * 13 // 5) % 256 for x in range(256 * 3)]
 
 
-def read_palette(stream: IO[bytes]) -> bytes:
-    return bytes(((x << 2) | (x & 3)) % 256 for x in stream.read(0x300))
+class CPSInfo(NamedTuple):
+    file_size: int
+    compression: int
+    image_size: int
+    palette_size: int
+    palette: Optional[bytes]
+
+    @property
+    def has_palette(self) -> bool:
+        return self.palette is not None
+
+
+def probe_cps(stream: IO[bytes]) -> CPSInfo:
+    # reads the header and the embedded palette only, leaving the image data
+    file_size = read_uint16_le(stream)
+    comp = read_uint16_le(stream)
+    img_size = read_uint32_le(stream)
+    palen = read_uint16_le(stream)
+
+    palette = None
+    if palen == PALETTE_SIZE:
+        palette = read_palette(stream)
+    return CPSInfo(file_size, comp, img_size, palen, palette)
+
+
+def verify_lcw(stream: IO[bytes], pos: int, im: bytes, debug: bool = False) -> None:
+    # re-encodes the decoded image and checks it decodes back the same
+    pos2 = stream.tell()
+    stream.seek(pos)
+    orig = stream.read(pos2 - pos)
+    stream.seek(pos2)
+    compr = encode_lcw(im)
+
+    # # HARD COMPARISON
+    # assert compr == orig
+    # for i in range(200):
+    #     if compr[i*320:(i+1)*320] != orig[i*320:(i+1)*320]:
+    #         print(len(compr[i*320:(i+1)*320]), compr[i*320:(i+1)*320])
+    #         print(len(orig[i*320:(i+1)*320]), orig[i*320:(i+1)*320])
+    #         exit(1)
+
+    # SOFT COMPARISON
+    with io.BytesIO(compr) as ins:
+        if debug:
+            print('====================')
+        uncomp = decode_lcw(ins, b'\0' * len(im), len(im))
+        assert im == uncomp, (im, uncomp)
+
+
+def check_trailer(stream: IO[bytes], file_size: int) -> None:
+    # some files are padded with a single 0x80 byte past the stored size
+    diff = stream.tell() - file_size
+    assert 0 <= diff < 2, (stream.tell(), file_size)
+    rest = stream.read()
+    assert rest == b'\x80' * diff, rest
+    # assert not rest, rest
 
 
 def decode_cps(
@@ -35,18 +103,19 @@ def decode_cps(
     skip: bool = False,
     verify: bool = False,
     decode: bool = True,
+    debug: bool = False,
 ) -> Tuple[bytes, Optional[bytes]]:
     if skip:
-        print('SKIP', stream.read(4))
+        skipped = stream.read(4)
+        if debug:
+            print('SKIP', skipped)
 
-    file_size = read_uint16_le(stream)
-    comp = read_uint16_le(stream)
-    img_size = read_uint32_le(stream)
-    palen = read_uint16_le(stream)
-    print(comp, img_size, palen)
+    file_size, comp, img_size, palen, embedded = probe_cps(stream)
+    if debug:
+        print(comp, img_size, palen)
 
-    if palen == 0x300:
-        palette = read_palette(stream)
+    if embedded is not None:
+        palette = embedded
 
     if not decode:
         return stream.read(), palette
@@ -56,55 +125,88 @@ def decode_cps(
         im = decode_lcw(stream, b'\0' * img_size, img_size)
 
         if verify:
-            pos2 = stream.tell()
-            stream.seek(pos)
-            orig = stream.read(pos2 - pos)
-            stream.seek(pos2)
-            compr = encode_lcw(im)
-
-            # # HARD COMPARISON
-            # assert compr == orig
-            # for i in range(200):
-            #     if compr[i*320:(i+1)*320] != orig[i*320:(i+1)*320]:
-            #         print(len(compr[i*320:(i+1)*320]), compr[i*320:(i+1)*320])
-            #         print(len(orig[i*320:(i+1)*320]), orig[i*320:(i+1)*320])
-            #         exit(1)
-
-            # SOFT COMPARISON
-            with io.BytesIO(compr) as ins:
-                print('====================')
-                uncomp = decode_lcw(ins, b'\0' * img_size, img_size)
-                assert im == uncomp, (im, uncomp)
+            verify_lcw(stream, pos, im, debug=debug)
 
     elif comp == Compression.RLE:
-        buffer = bytearray(img_size)
-        dst = 0
-        while dst < img_size:
-            code = read_int8(stream)
-            if code == 0:
-                sz = read_uint16_be(stream)
-                buffer[dst:dst+sz] = stream.read(1) * sz
-                dst += sz
-            elif code < 0:
-                buffer[dst:dst-code] = stream.read(1) * -code
-                dst += -code
-            else:
-                buffer[dst:dst+code] += stream.read(code)
-                dst += code
-        im = bytes(buffer)
+        im = decode_rle(stream, img_size)
 
     else:
         raise NotImplementedError(comp)
 
-    diff = stream.tell() - file_size
-    assert 0 <= diff < 2 , (stream.tell(), file_size)
-    rest = stream.read()
-    assert rest == b'\x80' * diff, rest
-    # assert not rest, rest
-
+    check_trailer(stream, file_size)
     return im, palette
 
 
+def decode_cps_array(
+    stream: IO[bytes],
+    palette: Optional[bytes] = None,
+    out: Optional[np.ndarray] = None,
+    verify: bool = False,
+    debug: bool = False,
+) -> Tuple[np.ndarray, Optional[bytes]]:
+    # Decodes straight into a (height, width) uint8 array, a new one unless
+    # `out` is given. Short images leave the rest of the array zeroed, longer
+    # ones are cut to its size like the exported images always were.
+    if out is None:
+        out = np.zeros((CPS_HEIGHT, CPS_WIDTH), dtype=np.uint8)
+    else:
+        # LCW leaves zero offset copies untouched, so stale pixels would show
+        assert out.dtype == np.uint8 and out.flags.c_contiguous, out
+        out.fill(0)
+    flat = out.reshape(-1)
+
+    file_size, comp, img_size, palen, embedded = probe_cps(stream)
+    if debug:
+        print(comp, img_size, palen)
+
+    if embedded is not None:
+        palette = embedded
+
+    # the whole stream has to be decoded to validate its end
+    target = flat if img_size <= flat.size else np.zeros(img_size, dtype=np.uint8)
+    if comp == Compression.LCW:
+        pos = stream.tell()
+        decode_lcw_into(stream, target, img_size)
+        if verify:
+            verify_lcw(stream, pos, target[:img_size].tobytes(), debug=debug)
+
+    elif comp == Compression.RLE:
+        decode_rle_into(stream, target, img_size)
+
+    else:
+        raise NotImplementedError(comp)
+
+    if target is not flat:
+        flat[:] = target[: flat.size]
+
+    check_trailer(stream, file_size)
+    return out, palette
+
+
+def decode_cps_image(
+    stream: IO[bytes],
+    palette: Optional[bytes] = None,
+    verify: bool = False,
+    debug: bool = False,
+) -> Image.Image:
+    pixels, palette = decode_cps_array(stream, palette, verify=verify, debug=debug)
+    im = Image.fromarray(pixels, mode='P')
+    if palette:
+        im.putpalette(palette)
+    return im
+
+
+def export_cps(stream: IO[bytes], item: WorkItem, verify: bool = False) -> Outputs:
+    bname = os.path.basename(item.fname)
+    pixels, npal = decode_cps_array(stream, verify=verify)
+    if npal:
+        return encode_png_variants(pixels, [(f'{bname}.png', npal)])
+    return encode_png_variants(
+        pixels,
+        [(f'{bname}.{palname}.png', palette) for palname, palette in item.palettes],
+    )
+
+
 class GameCPSDef(TypedDict):
     palettes: Sequence[str]
     patterns: Mapping[str, Sequence[str]]
@@ -268,7 +370,6 @@ GAMES: Mapping[str, GameCPSDef] = {
 
 
 if __name__ == '__main__':
-    width, height = 320, 200
     import argparse
 
     parser = argparse.ArgumentParser(description='extract pak archive')
@@ -288,48 +389,48 @@ if __name__ == '__main__':
         required=False,
         help='Verify re-encoded decompresses to same image',
     )
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help='keep parsed archive indices in the game directory between runs',
+    )
+    parser.add_argument(
+        '--workers', '-j', type=int, default=1, help='number of worker processes'
+    )
     args = parser.parse_args()
 
     palettes = {}
+    cache = IndexCache.for_directory(args.directory) if args.cache else None
     patterns = GAMES[args.game]
 
     graphics_dir = Path('graphics')
     os.makedirs(graphics_dir, exist_ok=True)
 
     for pak, pattern, fname in match_archive_files(
-        args.directory, patterns['palettes']
+        args.directory, patterns['palettes'], cache=cache
     ):
         bname = os.path.basename(fname)
         with pak.open(fname, 'rb') as stream:
             palette = None
             if Path(bname).match('*.CPS'):
-                _, palette = decode_cps(stream, None, decode=False)
+                palette = probe_cps(stream).palette
             elif Path(bname).match('*.COL'):
                 palette = read_palette(stream)
             if palette:
                 palettes[bname] = palette
 
-    for pak, pattern, fname in match_archive_files(
-        args.directory, patterns['patterns']
+    items = []
+    for location, pattern, fname in locate_archive_files(
+        args.directory, patterns['patterns'], cache=cache
     ):
-        bname = os.path.basename(fname)
         print(fname, pattern)
-        with pak.open(fname, 'rb') as fstream:
-            im, npal = decode_cps(fstream, palette, verify=args.check)
-            im += b'\0' * width * height
-            bim = Image.fromarray(
-                np.frombuffer(im, dtype=np.uint8)[: width * height].reshape(
-                    height,
-                    width,
-                ),
-                mode='P',
-            )
-            if npal:
-                bim.putpalette(npal or palettes[patterns['patterns'][pattern]])
-                bim.save(graphics_dir / f'{bname}.png')
-            else:
-                for palpat in patterns['patterns'][pattern]:
-                    for palname in palettes:
-                        if Path(palname).match(palpat):
-                            bim.putpalette(npal or palettes[palname])
-                            bim.save(graphics_dir / f'{bname}.{palname}.png')
+        candidates = match_palettes(palettes, patterns['patterns'][pattern])
+        items.append(WorkItem(location, str(fname), tuple(candidates)))
+
+    results = run_batch(
+        items, partial(export_cps, verify=args.check), workers=args.workers
+    )
+    write_outputs(results, graphics_dir)
+
+    if cache:
+        cache.save()
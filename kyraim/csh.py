@@ -0,0 +1,54 @@
+from typing import IO, NamedTuple, Optional, Tuple
+
+from kyraim.codex.base import read_uint16_le, read_uint32_le_array
+from kyraim.cps import Compression, probe_cps
+
+
+class CSHInfo(NamedTuple):
+    compression: int
+    image_size: int
+    palette: Optional[bytes]
+    # None when the shape table is compressed and cannot be read without
+    # decoding the body
+    offsets: Optional[Tuple[int, ...]]
+
+    @property
+    def has_palette(self) -> bool:
+        return self.palette is not None
+
+    @property
+    def shapes(self) -> Optional[int]:
+        # empty slots in the table are stored as zero offsets
+        if self.offsets is None:
+            return None
+        return sum(1 for off in self.offsets if off)
+
+
+def probe_csh(stream: IO[bytes]) -> CSHInfo:
+    # shape collections use the CPS container, the body starts with the
+    # shape count and a table of offsets to the shapes
+    info = probe_cps(stream)
+    offsets = None
+    if info.compression == Compression.UNCOMPRESSED:
+        num_shapes = read_uint16_le(stream)
+        offsets = tuple(read_uint32_le_array(stream, num_shapes))
+    return CSHInfo(info.compression, info.image_size, info.palette, offsets)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='list shape collection headers')
+    parser.add_argument('files', nargs='+', help='csh files')
+    args = parser.parse_args()
+
+    for fname in args.files:
+        with open(fname, 'rb') as f:
+            info = probe_csh(f)
+        print(
+            fname,
+            Compression(info.compression).name,
+            info.image_size,
+            info.shapes,
+            'palette' if info.has_palette else '',
+        )
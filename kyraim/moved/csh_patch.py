@@ -3,7 +3,11 @@ import io
 import numpy as np
 from PIL import Image
 
-from kyraim.codex.base import read_uint16_le, read_uint32_le
+from kyraim.codex.base import (
+    read_uint16_le,
+    read_uint32_le,
+    read_uint32_le_array,
+)
 from kyraim.codex.lcw import decode_lcw, encode_lcw
 from kyraim.cps import read_palette
 
@@ -49,7 +53,7 @@ if __name__ == '__main__':
         patch = bytearray()
         with io.BytesIO(bytes(im)) as csh:
             num_shapes = read_uint16_le(csh)
-            offsets_o = [read_uint32_le(csh) for _ in range(num_shapes)]
+            offsets_o = read_uint32_le_array(csh, num_shapes)
             print(csh.tell(), offsets_o)
 
             aft = csh.tell()
@@ -3,7 +3,7 @@ import io
 import numpy as np
 from PIL import Image
 
-from kyraim.codex.base import read_uint16_le, read_uint32_le
+from kyraim.codex.base import read_uint16_le, read_uint32_le_array
 from kyraim.codex.lcw import decode_lcw
 from kyraim.cps import decode_cps, read_palette
 
@@ -19,7 +19,7 @@ if __name__ == '__main__':
 
         with io.BytesIO(xim) as csh:
             num_shapes = read_uint16_le(csh)
-            offsets = [read_uint32_le(csh) for _ in range(num_shapes)]
+            offsets = list(read_uint32_le_array(csh, num_shapes))
             print(csh.tell(), offsets)
 
             print(csh.read(2))
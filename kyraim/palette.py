@@ -0,0 +1,28 @@
+from pathlib import Path
+from typing import IO, List, Mapping, Sequence, Tuple
+
+
+PALETTE_SIZE = 0x300
+
+# expands 6-bit VGA components to 8-bit, the low bits repeat the lowest bits
+VGA_TO_RGB = bytes(((x << 2) | (x & 3)) % 256 for x in range(256))
+
+
+def convert_palette(data: bytes) -> bytes:
+    return data.translate(VGA_TO_RGB)
+
+
+def read_palette(stream: IO[bytes]) -> bytes:
+    return convert_palette(stream.read(PALETTE_SIZE))
+
+
+def match_palettes(
+    palettes: Mapping[str, bytes], patterns: Sequence[str]
+) -> List[Tuple[str, bytes]]:
+    # candidates in pattern order, each pattern in palette load order
+    return [
+        (palname, palettes[palname])
+        for palpat in patterns
+        for palname in palettes
+        if Path(palname).match(palpat)
+    ]
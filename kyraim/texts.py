@@ -1,9 +1,14 @@
 import csv
+import fnmatch
 import io
 import os
+import re
+from contextlib import contextmanager
 from pathlib import Path
+from typing import NamedTuple, Optional
 
 from kyraim.archive import pakfile, installer
+from kyraim.archive.cache import SELF, IndexCache
 from kyraim.codex.texts import asis, ccode, dlg, emc, tre
 
 
@@ -38,48 +43,152 @@ GAMES = {
 }
 
 
-def match_archive_files(path, patterns):
+def glob_files(path, pattern, cache=None):
+    if cache is None:
+        return sorted(path.glob(pattern))
+    return cache.glob(path, pattern)
+
+
+def open_archive(opener, path, cache=None, stream=None, member=SELF):
+    if cache is None:
+        return opener(path if stream is None else stream, use_mmap=True)
+    return cache.open(opener, path, stream=stream, member=member, use_mmap=True)
+
+
+class PatternMatcher:
+    # Matches a name against an ordered list of glob patterns in one pass,
+    # literal names are looked up in a dict and wildcards share a single regex.
+    # Equivalent to the first pattern for which `Path(fname).match` holds,
+    # names and patterns are compared in normcase so it ignores case on Windows.
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.rank = {}
+        self._literals = {}
+        self._nested = []
+        wildcards = []
+        for idx, pattern in enumerate(self.patterns):
+            self.rank.setdefault(pattern, idx)
+            if '/' in pattern:
+                self._nested.append(idx)
+            elif any(c in pattern for c in '*?['):
+                wildcards.append((idx, os.path.normcase(pattern)))
+            else:
+                self._literals.setdefault(os.path.normcase(pattern), idx)
+        self._regex = None
+        if wildcards:
+            # named, as fnmatch adds its own groups for some patterns (3.9, 3.10)
+            self._regex = re.compile(
+                '|'.join(
+                    f'(?P<p{idx}>{fnmatch.translate(pattern)})'
+                    for idx, pattern in wildcards
+                )
+            )
+
+    def match_index(self, fname):
+        name = os.path.normcase(fname.rpartition('/')[2])
+        best = self._literals.get(name)
+        if self._regex is not None:
+            m = self._regex.match(name)
+            if m:
+                idx = int(m.lastgroup[1:])
+                best = idx if best is None else min(best, idx)
+        for idx in self._nested:
+            if best is not None and idx > best:
+                break
+            if Path(fname).match(self.patterns[idx]):
+                return idx
+        return best
+
+    def match(self, fname):
+        idx = self.match_index(fname)
+        return None if idx is None else self.patterns[idx]
+
+
+class ArchiveLocation(NamedTuple):
+    # where a matched file lives: a loose file, a PAK or an installer volume,
+    # optionally a PAK nested in the installer
+    kind: str
+    path: Optional[Path] = None
+    member: Optional[str] = None
+
+
+LOOSE_FILE = ArchiveLocation('file')
+
+
+def scan_archive_files(path, patterns, cache=None):
     parsed_files = set()
     path = Path(path)
+    matcher = PatternMatcher(patterns)
+
+    def scan_index(location, archive):
+        for fname in archive.index:
+            if fname not in parsed_files:
+                text_pattern = matcher.match(fname)
+                if text_pattern is not None:
+                    parsed_files.add(fname)
+                    yield location, archive, text_pattern, fname
 
     for text_pattern in patterns:
-        for fname in path.glob(text_pattern):
+        for fname in glob_files(path, text_pattern, cache):
             if fname not in parsed_files:
                 parsed_files.add(fname)
-                yield io, text_pattern, fname
-
-    for archive in sorted(path.glob(ARCHIVE_PATTERN)):
-        with pakfile.open(archive) as f:
-            for fname in f.index:
-                for text_pattern in patterns:
-                    if Path(fname).match(text_pattern):
-                        if fname not in parsed_files:
-                            parsed_files.add(fname)
-                            yield f, text_pattern, fname
-
-    for inst in sorted(path.glob(INSTALLER_PATTERN)):
-        with installer.open(inst) as ins:
-            for text_pattern in patterns:
-                for fname in ins.glob(text_pattern):
-                    if fname not in parsed_files:
-                        parsed_files.add(fname)
-                        yield ins, text_pattern, fname
+                yield LOOSE_FILE, io, text_pattern, fname
+
+    for archive in glob_files(path, ARCHIVE_PATTERN, cache):
+        with open_archive(pakfile.open, archive, cache) as f:
+            yield from scan_index(ArchiveLocation('pak', archive), f)
+
+    for inst in glob_files(path, INSTALLER_PATTERN, cache):
+        with open_archive(installer.open, inst, cache) as ins:
+            # installer members are reported in pattern order
+            yield from sorted(
+                scan_index(ArchiveLocation('installer', inst), ins),
+                key=lambda m: matcher.rank[m[2]],
+            )
 
             archives = ins.glob(ARCHIVE_PATTERN)
             for archive in archives:
-                with ins.open(archive, 'rb') as pakstream:
-                    with pakfile.open(pakstream) as f:
-                        for fname in f.index:
-                            for text_pattern in patterns:
-                                if Path(fname).match(text_pattern):
-                                    if fname not in parsed_files:
-                                        parsed_files.add(fname)
-                                        yield f, text_pattern, fname
+                with ins.substream(archive) as pakstream:
+                    with open_archive(
+                        pakfile.open, inst, cache, stream=pakstream, member=archive
+                    ) as f:
+                        location = ArchiveLocation('installer', inst, archive)
+                        yield from scan_index(location, f)
+
+
+def match_archive_files(path, patterns, cache=None):
+    for _, archive, pattern, fname in scan_archive_files(path, patterns, cache):
+        yield archive, pattern, fname
+
 
+def locate_archive_files(path, patterns, cache=None):
+    for location, _, pattern, fname in scan_archive_files(path, patterns, cache):
+        yield location, pattern, fname
 
-def decode(patterns, path):
+
+@contextmanager
+def open_location(location, cache=None):
+    if location.kind == 'file':
+        yield io
+        return
+
+    opener = pakfile.open if location.kind == 'pak' else installer.open
+    with open_archive(opener, location.path, cache) as archive:
+        if location.member is None:
+            yield archive
+            return
+        member = location.member
+        with archive.substream(member) as stream:
+            with open_archive(
+                pakfile.open, location.path, cache, stream=stream, member=member
+            ) as pak:
+                yield pak
+
+
+def decode(patterns, path, cache=None):
     open_files = set()
-    for pak, pattern, fname in match_archive_files(path, patterns):
+    for pak, pattern, fname in match_archive_files(path, patterns, cache=cache):
         agg_file, parse, _ = patterns[pattern]
         with pak.open(fname, 'rb') as stream:
             text_file = texts_dir / (agg_file + '.tsv')
@@ -122,6 +231,11 @@ if __name__ == '__main__':
         action='store_true',
         help='create modifed game resource with the changes',
     )
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help='keep parsed archive indices in the game directory between runs',
+    )
     args = parser.parse_args()
 
     patterns = GAMES[args.game]
@@ -130,6 +244,9 @@ if __name__ == '__main__':
     os.makedirs(texts_dir, exist_ok=True)
 
     if not args.rebuild:
-        decode(patterns, args.directory)
+        cache = IndexCache.for_directory(args.directory) if args.cache else None
+        decode(patterns, args.directory, cache=cache)
+        if cache:
+            cache.save()
     else:
         encode(patterns)
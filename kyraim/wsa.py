@@ -1,15 +1,29 @@
 import os
+from functools import partial
 from pathlib import Path
-from typing import Mapping
+from typing import IO, Mapping, NamedTuple, Optional, Tuple
 
 import numpy as np
 from PIL import Image
-from kyraim.codex.base import read_uint16_le, read_uint32_le
-from kyraim.codex.lcw import decode_lcw
-from kyraim.codex.xor_delta import compress_xor_buffer, decompress_xor_buffer
+from kyraim.codex.base import read_uint16_le, read_uint32_le_array
+from kyraim.codex.lcw import decode_lcw_into
+from kyraim.codex.xor_delta import (
+    apply_xor_delta,
+    compress_xor_buffer,
+    decompress_xor_buffer,
+)
 
-from kyraim.texts import match_archive_files
-from kyraim.cps import GameCPSDef, decode_cps, read_palette
+from kyraim.archive.cache import IndexCache
+from kyraim.batch import (
+    Outputs,
+    WorkItem,
+    encode_png_variants,
+    run_batch,
+    write_outputs,
+)
+from kyraim.texts import locate_archive_files, match_archive_files
+from kyraim.cps import GameCPSDef, probe_cps
+from kyraim.palette import match_palettes, read_palette
 
 
 WSA_FLAGS = {
@@ -22,7 +36,57 @@ WSA_FLAGS = {
 }
 
 
-def decode_wsa_sequence(stream, palette, version='kyra'):
+class WSAInfo(NamedTuple):
+    frames: int
+    xpos: Optional[int]
+    ypos: Optional[int]
+    width: int
+    height: int
+    delta_size: int
+    flags: int
+    offsets: Tuple[int, ...]
+    file_size: int
+    palette: Optional[bytes]
+
+    @property
+    def has_palette(self) -> bool:
+        return self.palette is not None
+
+
+def probe_wsa(stream: IO[bytes], version: str = 'kyra') -> WSAInfo:
+    # reads the header, frame offsets and embedded palette, no frame data
+    num_frames = read_uint16_le(stream)
+
+    xpos = ypos = None
+    if version == 'kyra2':
+        xpos = read_uint16_le(stream)
+        ypos = read_uint16_le(stream)
+
+    width = read_uint16_le(stream)
+    height = read_uint16_le(stream)
+    lcw_buffer_size = read_uint16_le(stream)
+    flags = read_uint16_le(stream)
+    *offs, file_size = read_uint32_le_array(stream, num_frames + 2)
+
+    palette = None
+    if flags & 1:
+        palette = read_palette(stream)
+    return WSAInfo(
+        num_frames,
+        xpos,
+        ypos,
+        width,
+        height,
+        lcw_buffer_size,
+        flags,
+        tuple(offs),
+        file_size,
+        palette,
+    )
+
+
+def decode_wsa_frames(stream, palette, version='kyra', verify=False):
+    # yields the frame array, reused for the next frame, with its palette
     # https://moddingwiki.shikadi.net/wiki/Westwood_WSA_Format
     # UINT16LE	NrOfFrames	Number of frames.
     # UINT16LE	XPos	X-offset of the frame data. This field does not appear in the Dune II versions of the format.
@@ -34,71 +98,89 @@ def decode_wsa_sequence(stream, palette, version='kyra'):
     # UINT32LE[NrOfFrames+2]	FrameOffsets	Addresses of the frame offsets. The addresses are relative to the start of the file, but do not take the palette into account, meaning that if the HasPalette flag is enabled, 768 bytes need to be added to these offsets to find the actual data.
     # BYTE[768]	Palette	A 256-colour 6-bit RGB VGA palette. Only occurs if the HasPalette flag is enabled. This is an 8-bit RGB VGA palette in the Monopoly version of the format.
 
-    num_frames = read_uint16_le(stream)
-
-    if version == 'kyra2':
-        _xpos = read_uint16_le(stream)
-        _ypos = read_uint16_le(stream)
-
-    width = read_uint16_le(stream)
-    height = read_uint16_le(stream)
-    lcw_buffer_size = read_uint16_le(stream)
-    flags = read_uint16_le(stream)
-    offs = [read_uint32_le(stream) for _ in range(num_frames + 1)]
-    file_size = read_uint32_le(stream)
+    info = probe_wsa(stream, version=version)
+    num_frames, width, height = info.frames, info.width, info.height
+    lcw_buffer_size, flags = info.delta_size, info.flags
+    offs, file_size = info.offsets, info.file_size
 
     has_palette = flags & 1
 
     if has_palette:
-        palette = read_palette(stream)
+        palette = info.palette
 
     print(num_frames, width, height, lcw_buffer_size, flags)
     # print(xpos, ypos)
     print(offs)
 
     frame = np.zeros((height, width), dtype=np.uint8)
-    lcw_buffer = b'\0' * lcw_buffer_size
+    lcw_buffer = bytearray(lcw_buffer_size)
 
     for off in offs:
         assert stream.tell() == off + has_palette * len(palette), (
             stream.tell(),
             off + has_palette * len(palette),
         )
-        lcw_buffer = b'\0' * lcw_buffer_size
 
         if off == offs[-1] and file_size == 0:  # kyra2
             break
-        lcw_buffer = decode_lcw(stream, lcw_buffer, lcw_buffer_size)
+        decode_lcw_into(stream, lcw_buffer, lcw_buffer_size)
 
-        old_frame = np.array(frame, dtype=np.uint8)  # for verification
+        if verify:
+            old_frame = np.array(frame, dtype=np.uint8)
+            uncomp = decompress_xor_buffer(lcw_buffer)
+            comp = compress_xor_buffer(
+                uncomp,
+                # bytes(lcw_buffer)
+            )
+            assert decompress_xor_buffer(comp) == uncomp
+            # assert comp == bytes(lcw_buffer), (comp, bytes(lcw_buffer))
 
-        uncomp = decompress_xor_buffer(lcw_buffer)
-        comp = compress_xor_buffer(
-            uncomp,
-            # bytes(lcw_buffer)
-        )
-        assert decompress_xor_buffer(comp) == uncomp
-        # assert comp == bytes(lcw_buffer), (comp, bytes(lcw_buffer))
+        apply_xor_delta(lcw_buffer, frame)
 
-        decoded_xor = np.frombuffer(
-            decompress_xor_buffer(lcw_buffer), dtype=np.uint8
-        )
-        _rest = decoded_xor[height * width:]
-        # assert len(rest) == 0 or np.all(rest == 0), rest
-        decoded_xor = decoded_xor[:height * width].reshape(height, width)
-        frame ^= decoded_xor
+        if verify:
+            decoded_xor = np.frombuffer(uncomp, dtype=np.uint8)
+            _rest = decoded_xor[height * width :]
+            # assert len(rest) == 0 or np.all(rest == 0), rest
+            decoded_xor = decoded_xor[: height * width].reshape(height, width)
+            assert np.array_equal(decoded_xor, frame ^ old_frame)
 
-        assert np.array_equal(decoded_xor, frame ^ old_frame)
-        im = Image.fromarray(frame.reshape(height, width), mode='P')
-        if palette:
-            im.putpalette(palette)
-        yield im, has_palette
+        yield frame, palette, has_palette
 
     assert stream.read() == b''
     if file_size != 0:
         assert stream.tell() == file_size, (stream.tell(), file_size)
 
 
+def decode_wsa_sequence(stream, palette, version='kyra', verify=False):
+    for frame, palette, has_palette in decode_wsa_frames(
+        stream, palette, version=version, verify=verify
+    ):
+        im = Image.fromarray(frame, mode='P')
+        if palette:
+            im.putpalette(palette)
+        yield im, has_palette
+
+
+def export_wsa(
+    stream: IO[bytes], item: WorkItem, version: str = 'kyra', verify: bool = False
+) -> Outputs:
+    bname = os.path.basename(item.fname)
+    outputs = []
+    for idx, (frame, palette, has_palette) in enumerate(
+        decode_wsa_frames(stream, b'', version=version, verify=verify)
+    ):
+        if has_palette:
+            variants = [(f'{bname}/frame_{idx:05d}.png', palette)]
+        else:
+            variants = [
+                (f'{bname}/frame_{idx:05d}.{palname}.png', palette)
+                for palname, palette in item.palettes
+            ]
+        # encoded before the next frame overwrites the array
+        outputs += encode_png_variants(frame, variants)
+    return outputs
+
+
 GAMES: Mapping[str, GameCPSDef] = {
     'kyra': {
         'palettes': [
@@ -245,47 +327,60 @@ if __name__ == '__main__':
         required=True,
         help='Use specific game pattern',
     )
+    parser.add_argument(
+        '--check',
+        '-c',
+        action='store_true',
+        default=False,
+        required=False,
+        help='Verify re-encoded frame deltas decompress to same data',
+    )
 
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help='keep parsed archive indices in the game directory between runs',
+    )
+    parser.add_argument(
+        '--workers', '-j', type=int, default=1, help='number of worker processes'
+    )
     args = parser.parse_args()
 
     palettes = {}
+    cache = IndexCache.for_directory(args.directory) if args.cache else None
     patterns = GAMES[args.game]
 
     frames_dir = Path('frames')
 
     for pak, pattern, fname in match_archive_files(
-        args.directory, patterns['palettes']
+        args.directory, patterns['palettes'], cache=cache
     ):
         bname = os.path.basename(fname)
         with pak.open(fname, 'rb') as stream:
             palette = None
             if Path(bname).match('*.CPS'):
-                _, palette = decode_cps(stream, None, decode=False)
+                palette = probe_cps(stream).palette
             elif Path(bname).match('*.COL'):
                 palette = read_palette(stream)
             if palette:
                 palettes[bname] = palette
         print(bname)
 
-    for pak, pattern, fname in match_archive_files(
-        args.directory, patterns['patterns']
+    items = []
+    for location, pattern, fname in locate_archive_files(
+        args.directory, patterns['patterns'], cache=cache
     ):
-        bname = os.path.basename(fname)
-        os.makedirs(frames_dir / bname, exist_ok=True)
+        os.makedirs(frames_dir / os.path.basename(fname), exist_ok=True)
         print(fname, pattern)
-        with pak.open(fname, 'rb') as fstream:
-            for idx, (im, has_palette) in enumerate(
-                decode_wsa_sequence(fstream, b'', version=args.game)
-            ):
-                if has_palette:
-                    im.save(frames_dir / bname / f'frame_{idx:05d}.png')
-                else:
-                    for palpat in patterns['patterns'][pattern]:
-                        for palname in palettes:
-                            if Path(palname).match(palpat):
-                                im.putpalette(palettes[palname])
-                                im.save(
-                                    frames_dir
-                                    / bname
-                                    / f'frame_{idx:05d}.{palname}.png'
-                                )
+        candidates = match_palettes(palettes, patterns['patterns'][pattern])
+        items.append(WorkItem(location, str(fname), tuple(candidates)))
+
+    results = run_batch(
+        items,
+        partial(export_wsa, version=args.game, verify=args.check),
+        workers=args.workers,
+    )
+    write_outputs(results, frames_dir)
+
+    if cache:
+        cache.save()
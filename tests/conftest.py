@@ -0,0 +1,19 @@
+from pathlib import Path
+from typing import Sequence, Tuple
+
+from kyraim.archive.pakfile_writer import PakWriter
+
+
+def write_pak(path: Path, entries: Sequence[Tuple[str, bytes]]) -> None:
+    writer = PakWriter()
+    for fname, data in entries:
+        writer.add_bytes(fname, data)
+    with open(path, 'wb') as output:
+        writer.write(output)
+
+
+def build_installer(entries: Sequence[Tuple[str, bytes]]) -> bytes:
+    # an installer volume: a name list followed by sized members
+    names = b''.join(fname.encode('ascii') + b'\r\n' for fname, _ in entries)
+    data = b''.join(len(data).to_bytes(4, 'little') + data for _, data in entries)
+    return b'\0\0\0' + len(names).to_bytes(4, 'little') + names + data
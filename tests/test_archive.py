@@ -0,0 +1,310 @@
+from contextlib import contextmanager
+import io
+import os
+import time
+from typing import Iterator, List, Optional
+
+import pytest
+
+from kyraim.archive import installer, pakfile
+from kyraim.archive.base import (
+    ByteBudget,
+    ExtractProgress,
+    MemoryViewStream,
+    WindowStream,
+)
+from kyraim.archive.dedup import ContentIndex
+from kyraim.codex.lcw import decode_lcw_into, encode_lcw
+from kyraim.codex.rle import decode_rle_into, encode_rle
+from tests.conftest import build_installer, write_pak
+
+
+def frame_data(count: int, size: int) -> List[bytes]:
+    return [bytes((i * 7 + j // 5) % 256 for j in range(size)) for i in range(count)]
+
+
+@pytest.mark.parametrize(
+    'encode, decode_into',
+    [(encode_lcw, decode_lcw_into), (encode_rle, decode_rle_into)],
+)
+def test_mmap_decode_does_not_copy_entry(tmp_path, monkeypatch, encode, decode_into):
+    frames = frame_data(50, 1000)
+    path = tmp_path / 'ANIM.PAK'
+    write_pak(path, [('ANIM.WSA', b''.join(encode(frame) for frame in frames))])
+
+    reads: List[Optional[int]] = []
+    read = MemoryViewStream.read
+
+    def spy(self: MemoryViewStream, size: Optional[int] = -1) -> bytes:
+        reads.append(size)
+        return read(self, size)
+
+    monkeypatch.setattr(MemoryViewStream, 'read', spy)
+    with pakfile.open(path, use_mmap=True) as pak:
+        with pak.open('ANIM.WSA', 'rb') as stream:
+            assert isinstance(stream, MemoryViewStream)
+            for frame in frames:
+                out = bytearray(len(frame))
+                decode_into(stream, out, len(frame))
+                assert out == frame
+            assert stream.read() == b''
+
+    # only the final check read anything, the frames came from the mapping
+    assert reads == [-1]
+
+
+def test_bytesio_decode_advances_stream():
+    frames = frame_data(3, 5000)
+    data = b''.join(encode_lcw(frame) for frame in frames)
+    with io.BytesIO(data) as stream:
+        for frame in frames:
+            out = bytearray(len(frame))
+            decode_lcw_into(stream, out, len(frame))
+            assert out == frame
+        assert stream.tell() == len(data)
+
+
+class CountingReader(io.BufferedReader):
+    reads = 0
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        self.reads += 1
+        return super().read(size)
+
+
+def test_file_decode_reads_once(tmp_path):
+    frames = frame_data(3, 5000)
+    data = b''.join(encode_lcw(frame) for frame in frames)
+    path = tmp_path / 'FRAMES.LCW'
+    path.write_bytes(b'header' + data)
+    with CountingReader(io.FileIO(path)) as stream:
+        assert stream.read(6) == b'header'
+        for frame in frames:
+            out = bytearray(len(frame))
+            decode_lcw_into(stream, out, len(frame))
+            assert out == frame
+        assert stream.tell() == len(data) + 6
+        # a seek back to the first frame reuses the data read before
+        stream.seek(6)
+        out = bytearray(len(frames[0]))
+        decode_lcw_into(stream, out, len(out))
+        assert out == frames[0]
+        assert stream.reads == 2
+
+
+def u32(value: int) -> bytes:
+    return value.to_bytes(4, 'little')
+
+
+# one entry of 5 bytes: its offset, name and end offset, then an empty name
+PAK_INDEX = u32(15) + b'A.CPS\0' + u32(20) + b'\0'
+
+
+def test_read_index_entries():
+    with io.BytesIO(PAK_INDEX + b'abcde') as stream:
+        assert pakfile.read_index_entries(stream) == (['A.CPS'], [15, 20])
+
+
+@pytest.mark.parametrize(
+    'data, error, message',
+    [
+        (b'', EOFError, 'does not fit'),
+        (b'\x0f\x00', EOFError, 'does not fit'),
+        (PAK_INDEX[:10], EOFError, 'does not fit'),
+        (u32(7) + b'A.C', EOFError, 'inside an entry name'),
+        (u32(12) + b'A.CPS\0\x14\x00', EOFError, 'inside an entry offset'),
+        (PAK_INDEX + b'abc', EOFError, 'file has 18 bytes'),
+        (u32(15) + b'A.CPS\0' + u32(14) + b'\0', ValueError, 'ends before'),
+    ],
+    ids=[
+        'empty',
+        'cut header',
+        'cut index',
+        'cut name',
+        'cut offset',
+        'cut data',
+        'decreasing offsets',
+    ],
+)
+def test_read_index_entries_damaged(data, error, message):
+    with io.BytesIO(data) as stream:
+        with pytest.raises(error, match=message):
+            pakfile.read_index_entries(stream)
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_read_entry(tmp_path, use_mmap):
+    entries = [('A.CPS', b'first'), ('B.EMC', b''), ('C.WSA', b'third' * 100)]
+    path = tmp_path / 'TEST.PAK'
+    write_pak(path, entries)
+    with pakfile.open(path, use_mmap=use_mmap) as pak:
+        for fname, data in entries:
+            assert bytes(pak.read(fname)) == data
+        with pytest.raises(ValueError):
+            pak.read('MISSING.CPS')
+
+
+def test_released_buffer_keeps_stream():
+    with MemoryViewStream(b'abcdef') as stream:
+        with stream.getbuffer() as view:
+            assert bytes(view) == b'abcdef'
+        assert stream.read(3) == b'abc'
+
+
+def test_nested_mmap_close_keeps_parent(tmp_path):
+    inner = tmp_path / 'INNER.PAK'
+    write_pak(inner, [('A.CPS', b'nested')])
+    outer = tmp_path / 'OUTER.PAK'
+    write_pak(outer, [('INNER.PAK', inner.read_bytes()), ('B.CPS', b'outer')])
+    with pakfile.open(outer, use_mmap=True) as pak:
+        with pak.substream('INNER.PAK') as substream:
+            with pakfile.open(substream, use_mmap=True) as nested:
+                assert bytes(nested.read('A.CPS')) == b'nested'
+        assert bytes(pak.read('B.CPS')) == b'outer'
+        assert bytes(pak.read('INNER.PAK')) == inner.read_bytes()
+
+
+@pytest.mark.parametrize('source', ['path', 'stream'])
+def test_nested_pak_through_window(tmp_path, source):
+    nested = [
+        ('A.CPS', b'first' * 300),
+        ('B.EMC', b''),
+        ('C.WSA', frame_data(1, 5000)[0]),
+    ]
+    inner = tmp_path / 'INNER.PAK'
+    write_pak(inner, nested)
+    packed = inner.read_bytes()
+    volume = tmp_path / 'WESTWOOD.001'
+    volume.write_bytes(
+        build_installer(
+            [('X.EMC', b'before'), ('INNER.PAK', packed), ('Y.EMC', b'after')]
+        )
+    )
+
+    file = volume if source == 'path' else io.BytesIO(volume.read_bytes())
+    with installer.open(file) as inst:
+        with inst.substream('INNER.PAK') as window:
+            assert isinstance(window, WindowStream)
+            assert window.seek(0, io.SEEK_END) == len(packed)
+            assert window.read(10) == b''
+            window.seek(-6, io.SEEK_END)
+            assert window.read() == packed[-6:]
+            window.seek(100)
+            assert window.read(50) == packed[100:150]
+            assert window.seek(-20, io.SEEK_CUR) == 130
+            assert window.read(5) == packed[130:135]
+
+            window.seek(0)
+            with pakfile.open(window) as pak:
+                for fname, data in nested:
+                    assert bytes(pak.read(fname)) == data
+                done = pak.extractall(str(tmp_path / 'out'), workers=2)
+
+    assert done.files == len(nested)
+    for fname, data in nested:
+        assert (tmp_path / 'out' / fname).read_bytes() == data
+
+
+def test_dedup_extracts_each_payload_once(tmp_path):
+    write_pak(tmp_path / 'ONE.PAK', [('A.CPS', b'shared'), ('B.CPS', b'one')])
+    write_pak(tmp_path / 'TWO.PAK', [('A.CPS', b'two'), ('C.CPS', b'shared')])
+    content = ContentIndex()
+    with pakfile.open(tmp_path / 'ONE.PAK') as one:
+        with pakfile.open(tmp_path / 'TWO.PAK') as two:
+            content.add_archive('ONE.PAK', one)
+            content.add_archive('TWO.PAK', two, workers=2)
+            stats = content.extractall(str(tmp_path / 'out'))
+
+    assert stats == (4, 3, len(b'sharedonetwo'), len(b'shared'))
+    first = tmp_path / 'out' / 'ONE.PAK' / 'A.CPS'
+    copy = tmp_path / 'out' / 'TWO.PAK' / 'C.CPS'
+    assert copy.read_bytes() == b'shared'
+    assert first.stat().st_ino == copy.stat().st_ino
+    assert (tmp_path / 'out' / 'TWO.PAK' / 'A.CPS').read_bytes() == b'two'
+
+
+EXTRACT_ENTRIES = [
+    (f'FILE{idx:02d}.{ext}', bytes([idx]) * size)
+    for idx, (ext, size) in enumerate(
+        [('CPS', 3000), ('EMC', 100), ('WSA', 20000), ('CPS', 0), ('COL', 768)] * 4
+    )
+]
+
+
+@pytest.fixture
+def extract_pak(tmp_path):
+    path = tmp_path / 'EXTRACT.PAK'
+    write_pak(path, EXTRACT_ENTRIES)
+    return path
+
+
+def extracted(dirname: str) -> List[str]:
+    return sorted(os.listdir(dirname))
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+@pytest.mark.parametrize('workers', [1, 4])
+def test_extractall(tmp_path, extract_pak, use_mmap, workers):
+    out = tmp_path / 'out'
+    with pakfile.open(extract_pak, use_mmap=use_mmap) as pak:
+        done = pak.extractall(str(out), workers=workers)
+
+    assert extracted(str(out)) == sorted(fname for fname, _ in EXTRACT_ENTRIES)
+    for fname, data in EXTRACT_ENTRIES:
+        assert (out / fname).read_bytes() == data
+    assert done.files == done.total_files == len(EXTRACT_ENTRIES)
+    assert done.nbytes == sum(len(data) for _, data in EXTRACT_ENTRIES)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_extractall_pattern(tmp_path, extract_pak, workers):
+    out = tmp_path / 'out'
+    with pakfile.open(extract_pak) as pak:
+        done = pak.extractall(str(out), pattern='*.CPS', workers=workers)
+
+    expected = [(fname, data) for fname, data in EXTRACT_ENTRIES if '.CPS' in fname]
+    assert extracted(str(out)) == sorted(fname for fname, _ in expected)
+    assert done.files == done.total_files == len(expected)
+    assert done.nbytes == sum(len(data) for _, data in expected)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_extractall_progress(tmp_path, extract_pak, workers):
+    reports: List[ExtractProgress] = []
+    with pakfile.open(extract_pak) as pak:
+        done = pak.extractall(
+            str(tmp_path / 'out'), workers=workers, progress=reports.append
+        )
+
+    assert [status.files for status in reports] == list(
+        range(1, len(EXTRACT_ENTRIES) + 1)
+    )
+    assert all(status.total_files == len(EXTRACT_ENTRIES) for status in reports)
+    nbytes = [status.nbytes for status in reports]
+    assert nbytes == sorted(nbytes)
+    assert reports[-1] == done
+
+
+def test_extractall_budget(tmp_path, extract_pak, monkeypatch):
+    limit = 8000
+    held = []
+    reserve = ByteBudget.reserve
+
+    @contextmanager
+    def spy(self: ByteBudget, size: int) -> Iterator[None]:
+        with reserve(self, size):
+            held.append((self.used, size))
+            # keep the readers overlapping
+            time.sleep(0.002)
+            yield
+
+    monkeypatch.setattr(ByteBudget, 'reserve', spy)
+    with pakfile.open(extract_pak) as pak:
+        pak.extractall(str(tmp_path / 'out'), workers=4, max_inflight_bytes=limit)
+
+    assert len(held) == len(EXTRACT_ENTRIES)
+    # several readers at once, all within the limit
+    assert max(used for used, size in held if size <= limit) > 3000
+    assert all(used <= limit for used, size in held if size <= limit)
+    # an entry above the limit is read alone
+    assert [used for used, size in held if size > limit] == [20000] * 4
@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+
+import pytest
+
+from kyraim.archive import installer, pakfile
+from kyraim.archive.cache import CACHE_FILENAME, SELF, IndexCache
+from kyraim.archive.installer import WestwoodInstaller
+from kyraim.archive.pakfile import PakFile
+from tests.conftest import build_installer, write_pak
+
+
+ENTRIES = [('A.CPS', b'first'), ('B.WSA', b'second' * 10)]
+NESTED = [('C.CPS', b'nested'), ('D.EMC', b'script')]
+
+
+def forbid_scan(monkeypatch: pytest.MonkeyPatch) -> None:
+    # records have to come from the cache, parsing an index fails
+    def scan(self: object) -> None:
+        raise AssertionError('index parsed again')
+
+    monkeypatch.setattr(PakFile, '_create_index', scan)
+    monkeypatch.setattr(WestwoodInstaller, '_create_index', scan)
+
+
+def read_pak(cache, path):
+    with cache.open(pakfile.open, path) as pak:
+        return {fname: bytes(pak.read(fname)) for fname in pak.index}
+
+
+def read_nested(cache, path, member):
+    with cache.open(installer.open, path) as inst:
+        with inst.substream(member) as stream:
+            with cache.open(pakfile.open, path, stream=stream, member=member) as pak:
+                return {fname: bytes(pak.read(fname)) for fname in pak.index}
+
+
+def test_cached_index_is_reused(tmp_path, monkeypatch):
+    path = tmp_path / 'MAIN.PAK'
+    write_pak(path, ENTRIES)
+    with IndexCache.for_directory(tmp_path) as cache:
+        assert read_pak(cache, path) == dict(ENTRIES)
+
+    forbid_scan(monkeypatch)
+    with IndexCache.for_directory(tmp_path) as cache:
+        assert read_pak(cache, path) == dict(ENTRIES)
+
+
+def test_stale_record_is_rebuilt(tmp_path):
+    path = tmp_path / 'MAIN.PAK'
+    write_pak(path, ENTRIES)
+    with IndexCache.for_directory(tmp_path) as cache:
+        read_pak(cache, path)
+
+    changed = ENTRIES + [('E.COL', b'\1' * 768)]
+    write_pak(path, changed)
+    with IndexCache.for_directory(tmp_path) as cache:
+        assert read_pak(cache, path) == dict(changed)
+
+    content = json.loads((tmp_path / CACHE_FILENAME).read_text())
+    record = content['archives'][os.path.abspath(path)]
+    assert list(record['indices'][SELF]) == [fname for fname, _ in changed]
+
+
+def test_nested_installer_records(tmp_path, monkeypatch):
+    inner = tmp_path / 'INNER.PAK'
+    write_pak(inner, NESTED)
+    path = tmp_path / 'WESTWOOD.001'
+    path.write_bytes(build_installer([('INNER.PAK', inner.read_bytes())] + ENTRIES))
+    with IndexCache.for_directory(tmp_path) as cache:
+        assert read_nested(cache, path, 'INNER.PAK') == dict(NESTED)
+
+    content = json.loads((tmp_path / CACHE_FILENAME).read_text())
+    record = content['archives'][os.path.abspath(path)]
+    assert sorted(record['indices']) == sorted([SELF, 'INNER.PAK'])
+
+    with monkeypatch.context() as patch:
+        forbid_scan(patch)
+        with IndexCache.for_directory(tmp_path) as cache:
+            assert read_nested(cache, path, 'INNER.PAK') == dict(NESTED)
+
+    # a changed volume drops the records of its nested archives too
+    write_pak(inner, NESTED[:1])
+    path.write_bytes(build_installer([('INNER.PAK', inner.read_bytes())]))
+    with IndexCache.for_directory(tmp_path) as cache:
+        assert read_nested(cache, path, 'INNER.PAK') == dict(NESTED[:1])
+
+
+def test_save_failure_keeps_running(tmp_path, monkeypatch, caplog):
+    path = tmp_path / 'MAIN.PAK'
+    write_pak(path, ENTRIES)
+
+    def read_only(src, dst):
+        raise PermissionError(13, 'Permission denied', dst)
+
+    monkeypatch.setattr(os, 'replace', read_only)
+    with caplog.at_level(logging.WARNING):
+        with IndexCache.for_directory(tmp_path) as cache:
+            assert read_pak(cache, path) == dict(ENTRIES)
+
+    assert 'Cannot save index cache' in caplog.text
+    assert sorted(os.listdir(tmp_path)) == ['MAIN.PAK']
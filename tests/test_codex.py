@@ -0,0 +1,178 @@
+import io
+import random
+from typing import Tuple
+
+import numpy as np
+import pytest
+
+from kyraim.codex.lcw import (
+    EFFORT_LEVELS,
+    UINT16_MAX,
+    decode_lcw,
+    decode_lcw_buffer,
+    encode_lcw,
+)
+from kyraim.codex.rle import decode_rle, decode_rle_buffer, encode_rle
+from kyraim.codex.xor_delta import (
+    apply_xor_delta,
+    compress_xor_buffer,
+    decompress_xor_buffer,
+    decompress_xor_into,
+)
+
+
+def noise(size: int, seed: int = 0) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+def runs(size: int, seed: int = 0) -> bytes:
+    rand = random.Random(seed)
+    out = bytearray()
+    while len(out) < size:
+        out += bytes([rand.randrange(4)]) * rand.choice([1, 2, 5, 70, 300, 70000])
+    return bytes(out[:size])
+
+
+def copies(size: int, seed: int = 0) -> bytes:
+    # pieces of earlier data, near and far, with some fresh bytes in between
+    rand = random.Random(seed)
+    out = bytearray(rand.randbytes(64))
+    while len(out) < size:
+        if rand.random() < 0.2:
+            out += rand.randbytes(rand.randrange(1, 20))
+        else:
+            ln = rand.choice([3, 4, 10, 11, 64, 65, 500])
+            start = rand.randrange(len(out))
+            out += out[start : start + ln]
+    return bytes(out[:size])
+
+
+def periodic(size: int, seed: int = 0) -> bytes:
+    # every match overlaps the bytes it produces
+    return (b'abc' * (size // 3 + 1))[:size]
+
+
+SAMPLES = {
+    'byte': b'\x07',
+    'noise': noise(3000),
+    'runs': runs(5000),
+    'copies': copies(20000),
+    'periodic': periodic(4000),
+    'large copies': copies(UINT16_MAX + 6000, seed=1),
+    'large runs': runs(150000, seed=2),
+    'large periodic': periodic(UINT16_MAX + 1000),
+}
+
+
+@pytest.mark.parametrize('effort', list(EFFORT_LEVELS))
+@pytest.mark.parametrize('name', list(SAMPLES))
+def test_lcw_round_trip(name, effort):
+    data = SAMPLES[name]
+    encoded = encode_lcw(data, effort=effort)
+    # streams for buffers above 64 KiB use relative offsets
+    assert (encoded[0] == 0) == (len(data) > UINT16_MAX)
+
+    with io.BytesIO(encoded + b'trailing') as stream:
+        assert decode_lcw(stream, bytes(len(data)), len(data)) == data
+        assert stream.read() == b'trailing'
+
+    out = np.zeros(len(data), dtype=np.uint8)
+    assert decode_lcw_buffer(encoded, out, len(data)) == len(encoded)
+    assert out.tobytes() == data
+
+
+def test_lcw_effort_levels():
+    data = SAMPLES['copies']
+    sizes = [len(encode_lcw(data, effort=effort)) for effort in EFFORT_LEVELS]
+    assert sizes == sorted(sizes, reverse=True)
+    with pytest.raises(ValueError):
+        encode_lcw(data, effort='unknown')
+
+
+@pytest.mark.parametrize(
+    'encoded, expected',
+    [
+        # short relative copy, one byte back
+        (bytes([0x81, 0x61, 0x70, 0x01, 0x80]), b'a' * 11),
+        # absolute copy from the start, overlapping its own output
+        (bytes([0x82, 0x61, 0x62, 0xC5, 0x00, 0x00, 0x80]), b'ab' * 5),
+        # long absolute copy
+        (bytes([0x82, 0x61, 0x62, 0xFF, 0x64, 0x00, 0x00, 0x00, 0x80]), b'ab' * 51),
+        # relative mode: offsets count back from the current position
+        (bytes([0x00, 0x82, 0x61, 0x62, 0xC5, 0x02, 0x00, 0x80]), b'ab' * 5),
+    ],
+)
+def test_lcw_overlapping_copies(encoded, expected):
+    with io.BytesIO(encoded) as stream:
+        assert decode_lcw(stream, bytes(len(expected)), len(expected)) == expected
+
+
+@pytest.mark.parametrize(
+    'decode',
+    [
+        lambda stream: decode_lcw(stream, bytes(100), 100),
+        lambda stream: decode_rle(stream, 100),
+    ],
+    ids=['lcw', 'rle'],
+)
+def test_truncated_stream_error(decode):
+    # the stream buffer is released before the error reaches the caller,
+    # so closing the stream does not fail on the exported view
+    with pytest.raises(IndexError):
+        with io.BytesIO(bytes([0x05, 1, 2])) as stream:
+            decode(stream)
+
+
+@pytest.mark.parametrize('name', list(SAMPLES))
+def test_rle_round_trip(name):
+    data = SAMPLES[name]
+    encoded = encode_rle(data)
+    with io.BytesIO(encoded + b'trailing') as stream:
+        assert decode_rle(stream, len(data)) == data
+        assert stream.read() == b'trailing'
+
+    out = np.zeros(len(data), dtype=np.uint8)
+    assert decode_rle_buffer(encoded, out, len(data)) == len(encoded)
+    assert out.tobytes() == data
+
+
+def frame_pair(size: int, seed: int) -> Tuple[bytes, bytes]:
+    rand = random.Random(seed)
+    first = runs(size, seed)
+    second = bytearray(first)
+    pos = 0
+    while pos < size:
+        ln = rand.choice([1, 3, 4, 200, 20000, 40000])
+        kind = rand.randrange(3)
+        if kind == 1:
+            second[pos : pos + ln] = bytes([rand.randrange(256)]) * ln
+        elif kind == 2:
+            second[pos : pos + ln] = rand.randbytes(ln)
+        pos += ln
+    return first, bytes(second[:size])
+
+
+@pytest.mark.parametrize('size, seed', [(1, 0), (64000, 1), (200000, 2)])
+def test_xor_round_trip(size, seed):
+    first, second = frame_pair(size, seed)
+    delta = bytes(a ^ b for a, b in zip(first, second))
+    encoded = compress_xor_buffer(delta)
+    assert decompress_xor_buffer(encoded).ljust(size, b'\0') == delta
+
+    frame = np.frombuffer(first, dtype=np.uint8).copy()
+    apply_xor_delta(encoded, frame)
+    assert frame.tobytes() == second
+
+
+def test_xor_into_target():
+    first, second = frame_pair(5000, 3)
+    delta = bytes(a ^ b for a, b in zip(first, second))
+    encoded = compress_xor_buffer(delta)
+    out = np.full(6000, 0xFF, dtype=np.uint8)
+    assert decompress_xor_into(encoded, out) == len(delta)
+    assert out[: len(delta)].tobytes() == delta
+    assert (out[len(delta) :] == 0xFF).all()
+
+
+def test_xor_empty():
+    assert decompress_xor_buffer(compress_xor_buffer(b'')) == b''
@@ -0,0 +1,149 @@
+import io
+import os
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+
+from kyraim.archive import pakfile, pakfile_writer
+from kyraim.archive.pakfile_writer import PakWriter, add_pak_entries, patch_pak
+from tests.conftest import write_pak
+
+
+ENTRIES = [
+    (f'FILE{idx:02d}.{ext}', bytes((idx * 31 + j) % 251 for j in range(size)))
+    for idx, (ext, size) in enumerate(
+        [('CPS', 3000), ('EMC', 120), ('COL', 768), ('WSA', 5003), ('CPS', 0)] * 3
+    )
+]
+
+
+def rebuild(path: Path, pakname: Path) -> bytes:
+    with open(path, 'rb') as source, pakfile.open(source) as pak:
+        writer = PakWriter()
+        add_pak_entries(writer, source, pak, str(pakname))
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+
+def _unsupported_copy(*args: int) -> int:
+    raise OSError('copy not supported')
+
+
+@pytest.fixture(params=['default', 'sendfile', 'unsupported', 'chunked'])
+def kernel_copies(request, monkeypatch):
+    methods = {
+        'default': pakfile_writer.KERNEL_COPIES,
+        'sendfile': [pakfile_writer._sendfile],
+        'unsupported': [_unsupported_copy],
+        'chunked': [],
+    }[request.param]
+    if request.param == 'sendfile' and not hasattr(os, 'sendfile'):
+        pytest.skip('sendfile not available')
+    monkeypatch.setattr(pakfile_writer, 'KERNEL_COPIES', methods)
+
+
+@pytest.fixture
+def pak(tmp_path):
+    path = tmp_path / 'TEST.PAK'
+    write_pak(path, ENTRIES)
+    (tmp_path / 'TEST').mkdir()
+    return path
+
+
+def replace(pak: Path, fname: str, data: bytes) -> None:
+    (pak.parent / pak.stem / fname).write_bytes(data)
+
+
+def test_writer_reads_back(pak):
+    with pakfile.open(pak) as archive:
+        assert list(archive.index) == [fname for fname, _ in ENTRIES]
+        for fname, data in ENTRIES:
+            with archive.open(fname, 'rb') as stream:
+                assert stream.read() == data
+
+
+def test_patch_unchanged(pak):
+    original = pak.read_bytes()
+    fname, data = ENTRIES[3]
+    replace(pak, fname, data)
+    assert patch_pak(str(pak), str(pak.parent / 'TEST')) == []
+    assert pak.read_bytes() == original
+
+
+@pytest.mark.usefixtures('kernel_copies')
+def test_patch_same_size(pak):
+    source = pak.read_bytes()
+    replace(pak, ENTRIES[1][0], bytes(reversed(ENTRIES[1][1])))
+    replace(pak, ENTRIES[8][0], b'\xff' * len(ENTRIES[8][1]))
+    expected = rebuild(pak, pak.parent / 'TEST')
+
+    assert patch_pak(str(pak), str(pak.parent / 'TEST')) == [
+        ENTRIES[1][0],
+        ENTRIES[8][0],
+    ]
+    assert pak.read_bytes() == expected
+    assert len(expected) == len(source)
+
+
+@pytest.mark.usefixtures('kernel_copies')
+@pytest.mark.parametrize('delta', [-100, 1, 20000])
+def test_patch_resized(pak, delta):
+    fname, data = ENTRIES[6]
+    resized = (data * 10)[: len(data) + delta]
+    replace(pak, ENTRIES[0][0], b'\x01' * len(ENTRIES[0][1]))
+    replace(pak, fname, resized)
+    replace(pak, ENTRIES[11][0], b'\x02' * len(ENTRIES[11][1]))
+    expected = rebuild(pak, pak.parent / 'TEST')
+
+    assert patch_pak(str(pak), str(pak.parent / 'TEST')) == [
+        ENTRIES[0][0],
+        fname,
+        ENTRIES[11][0],
+    ]
+    assert pak.read_bytes() == expected
+    with pakfile.open(pak) as archive:
+        with archive.open(fname, 'rb') as stream:
+            assert stream.read() == resized
+
+
+def write_foreign_pak(path: Path, entries: List[Tuple[str, bytes]]) -> None:
+    # index ending with a single NUL instead of an empty entry
+    index_size = sum(4 + len(fname) + 1 for fname, _ in entries) + 5
+    index = b''
+    offset = index_size
+    for fname, data in entries:
+        index += offset.to_bytes(4, 'little') + fname.encode() + b'\0'
+        offset += len(data)
+    index += offset.to_bytes(4, 'little') + b'\0'
+    path.write_bytes(index + b''.join(data for _, data in entries))
+
+
+@pytest.mark.usefixtures('kernel_copies')
+def test_patch_foreign_index(pak):
+    write_foreign_pak(pak, ENTRIES)
+    replace(pak, ENTRIES[2][0], b'\x03' * len(ENTRIES[2][1]))
+    replace(pak, ENTRIES[5][0], b'resized')
+    expected = rebuild(pak, pak.parent / 'TEST')
+
+    assert patch_pak(str(pak), str(pak.parent / 'TEST')) == [
+        ENTRIES[2][0],
+        ENTRIES[5][0],
+    ]
+    assert pak.read_bytes() == expected
+
+
+@pytest.mark.parametrize('foreign', [False, True])
+def test_patch_failure_keeps_pak(pak, foreign):
+    if foreign:
+        write_foreign_pak(pak, ENTRIES)
+    original = pak.read_bytes()
+    replace(pak, ENTRIES[0][0], b'\x01' * len(ENTRIES[0][1]))
+    # listed as a replacement but cannot be read
+    (pak.parent / 'TEST' / ENTRIES[7][0]).mkdir()
+
+    with pytest.raises(OSError):
+        patch_pak(str(pak), str(pak.parent / 'TEST'))
+    assert pak.read_bytes() == original
+    assert sorted(os.listdir(pak.parent)) == ['TEST', 'TEST.PAK']
@@ -0,0 +1,76 @@
+import fnmatch
+from itertools import product
+import ntpath
+import os
+from pathlib import Path, PureWindowsPath
+
+import pytest
+
+from kyraim.texts import PatternMatcher
+
+
+PATTERNS = [
+    'X?Y*Z*.WSA',
+    '*A*B*.CPS',
+    'TOP.CPS',
+    '*.CPS',
+    'Q*Q*.*',
+    '*.WSA',
+]
+
+NAMES = [
+    'QQ.CPS',
+    'XAYBZC.WSA',
+    'XAYZ.WSA',
+    'AB.CPS',
+    'TOP.CPS',
+    'QAQB.EMC',
+    'OTHER.WSA',
+    'NONE.EMC',
+]
+
+
+def expected_match(fname, patterns):
+    return next((p for p in patterns if Path(fname).match(p)), None)
+
+
+@pytest.fixture(params=['plain', 'extra groups'])
+def translate_groups(request, monkeypatch):
+    # older fnmatch versions add capturing groups of their own for patterns
+    # with several stars, which must not shift the pattern lookup
+    if request.param == 'extra groups':
+        translate = fnmatch.translate
+        monkeypatch.setattr(fnmatch, 'translate', lambda pat: f'({translate(pat)})')
+
+
+@pytest.mark.usefixtures('translate_groups')
+@pytest.mark.parametrize('fname', NAMES)
+def test_match_multiple_stars(fname):
+    matcher = PatternMatcher(PATTERNS)
+    assert matcher.match(fname) == expected_match(fname, PATTERNS)
+
+
+@pytest.mark.usefixtures('translate_groups')
+def test_match_all_orders():
+    for patterns in product(PATTERNS, repeat=3):
+        matcher = PatternMatcher(patterns)
+        for fname in NAMES:
+            assert matcher.match(fname) == expected_match(fname, patterns)
+
+
+def test_match_nested_pattern():
+    matcher = PatternMatcher(['*.PAK/*.CPS', '*.CPS'])
+    assert matcher.match('MAIN.PAK/TOP.CPS') == '*.PAK/*.CPS'
+    assert matcher.match('TOP.CPS') == '*.CPS'
+
+
+def test_match_ignores_case_on_windows(monkeypatch):
+    monkeypatch.setattr(os.path, 'normcase', ntpath.normcase)
+    patterns = ['x?y*z*.wsa', 'Top.Cps', '*.cps']
+    matcher = PatternMatcher(patterns)
+    for fname in NAMES + ['xaybzc.wsa', 'top.cps', 'Other.Cps']:
+        expected = next((p for p in patterns if PureWindowsPath(fname).match(p)), None)
+        assert matcher.match(fname) == expected
+    assert matcher.match('XAYBZC.WSA') == 'x?y*z*.wsa'
+    assert matcher.match('TOP.CPS') == 'Top.Cps'
+    assert matcher.match('Other.Cps') == '*.cps'